@@ -1,86 +1,56 @@
-# app/services/instagram_dashboard.py
+# app/api/v1/endpoints/instagram.py
 import os
 from dotenv import load_dotenv
 
 load_dotenv()  # loads environment variables from .env into os.environ
 
-import os
-import requests
-from fastapi import APIRouter, HTTPException, Depends, Request
+from datetime import date, datetime, timedelta
+from fastapi import APIRouter, BackgroundTasks, Header, HTTPException, Depends, Query, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import JSONResponse
-from starlette.responses import RedirectResponse
-from pydantic import BaseModel, Field, parse_obj_as
-from typing import Any, List, Optional
-from sqlalchemy.orm import Session
-
-from app.services.oauth_storage import get_instagram_token
-from app.models.models import User, store_instagram_data, store_access_token
-from app.db.session import get_db, SessionLocal
+from starlette.responses import RedirectResponse, Response
+from pydantic import BaseModel, Field
+from typing import Optional
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.http import get_async_client
+from app.core.serialization import FAST_JSON_RESPONSES, dump_model, dumps
+from app.core.streaming import section_stream, stream_format
+from app.services.auth_cache import invalidate_user
+from app.services.dashboard_snapshots import (
+    INSTAGRAM_PARAMS_KEY,
+    SNAPSHOT_TTLS,
+    clear_snapshots,
+    is_stale,
+    latest_snapshot_async,
+    parse_sections,
+    save_snapshot,
+    schedule_revalidation,
+    snapshot_headers,
+    snapshot_response,
+    snapshot_sections,
+)
+from app.services.ig_snapshots import read_insights_range
+from app.services.instagram_dashboard import (
+    API_VERSION,
+    BASE_URL,
+    DASHBOARD_SECTIONS,
+    DashboardData,
+    build_instagram_dashboard,
+    graph_get,
+    iter_instagram_sections,
+    rebuild_instagram_snapshot,
+)
+from app.services.oauth_storage import get_instagram_account, get_instagram_token
+from app.models.models import User, store_access_token
+from app.db.session import get_async_db
 APP_ID = os.getenv('FB_APP_ID')
 APP_SECRET = os.getenv('FB_APP_SECRET')
 REDIRECT_URI = os.getenv('FB_REDIRECT_URI')
 FE_INSTAGRAM_REDIRECT_URI = os.getenv('FE_INSTAGRAM_REDIRECT_URI')
 router = APIRouter()
 
-# --- Pydantic schemas for responses ---
-class UserInsights(BaseModel):
-    date: str = Field(..., description="ISO date of the metric")
-    follower_count: int
-    reach: int
-    views: int
-    accounts_engaged: int
-    comments: int
-    likes: int
-    saves: int
-    shares: int
-    total_interactions: int
-class MediaItem(BaseModel):
-    id: str
-    caption: Optional[str]
-    timestamp: str
-    like_count: int = Field(0, alias="like_count")
-    comments_count: int = Field(0, alias="comments_count")
-    saves_count: int = Field(0, alias="saves_count")
-    shares_count: int = Field(0, alias="shares_count")
-    reach: Optional[int]
-    impressions: Optional[int]
-    media_url: Optional[str]
-    permalink: Optional[str]
-    media_type: str = "IMAGE"
-
-class ProfileOverview(BaseModel):
-    username: str
-    profile_picture_url: str
-    followers_count: int
-    follows_count: int
-    bio: Optional[str]
-    link_in_bio: Optional[str]
-    media_count: int             # ← new field for number of posts
-    profile_views: Optional[int] # ← existing field for insights
-
-
-class AudienceInsights(BaseModel):
-    reach: Optional[int]
-    views: Optional[int]
-    online_followers: Optional[Any]
-    profile_views: Optional[int]
-    website_clicks: Optional[int]
-
-class DashboardData(BaseModel):
-    profile: ProfileOverview
-    user_insights: List[UserInsights]
-    recent_media: List[MediaItem]
-    top_media: List[MediaItem]  # Top media sorted by impressions
-    total_followers: int
-    audience_insights: AudienceInsights
-    engagement_rate: Optional[float] = Field(
-        None, description="Average engagement rate across recent posts"
-    )
-
-# --- Constants ---
-API_VERSION = 'v22.0'
-BASE_URL = 'https://graph.facebook.com'
-
 user_email ={}
 class UserEmail(BaseModel):
     email: str = Field(..., description="User's email address")
@@ -103,21 +73,20 @@ def login(email:UserEmail):
         }
 
 @router.get("/callback")
-def callback(request: Request):
+async def callback(request: Request, db: AsyncSession = Depends(get_async_db)):
     code = request.query_params.get("code")
     if not code:
         raise HTTPException(400, "No code provided")
     # Exchange code for long-lived token (implementation omitted)
-    token_res = requests.get(
+    data = await graph_get(
         "https://graph.facebook.com/v19.0/oauth/access_token",
-        params={
-            "client_id": {APP_ID},
+        {
+            "client_id": APP_ID,
             "redirect_uri": REDIRECT_URI,
-            "client_secret": {APP_SECRET},
+            "client_secret": APP_SECRET,
             "code": code
         }
-    ) 
-    data = token_res.json()
+    )
     
     if "access_token" not in data:
         return JSONResponse({"error": data}, status_code=400)
@@ -125,274 +94,168 @@ def callback(request: Request):
     short_token = data["access_token"]
     print(short_token)
     # Exchange for long-lived token
-    long_token_res = requests.get(
+    long_token_res = await graph_get(
         "https://graph.facebook.com/v19.0/oauth/access_token",
-        params={
+        {
             "grant_type": "fb_exchange_token",
-            "client_id":{APP_ID},
-            "client_secret": {APP_SECRET},
+            "client_id": APP_ID,
+            "client_secret": APP_SECRET,
             "fb_exchange_token": short_token
         }
     )
-    long_token = long_token_res.json().get("access_token")
-    db = SessionLocal()
-    store_access_token(db=db, email = user_email["email"], access_token=long_token)
-    db.close()
+    long_token = long_token_res.get("access_token")
+    await store_access_token(db=db, email = user_email["email"], access_token=long_token)
     return RedirectResponse(url=FE_INSTAGRAM_REDIRECT_URI)
     # return JSONResponse({"access_token": long_token})
-# --- Helper to get Instagram User ID ---
-def _get_ig_user_id(access_token: str) -> str:
-    resp = requests.get(
-        f"{BASE_URL}/{API_VERSION}/me/accounts",
-        params={"access_token": access_token}
-    ).json()
-    if not resp.get("data"):
-        raise HTTPException(400, 'No Facebook pages found.')
-    page_id = resp["data"][0]["id"]
-    resp2 = requests.get(
-        f"{BASE_URL}/{API_VERSION}/{page_id}",
-        params={"fields": "instagram_business_account", "access_token": access_token}
-    ).json()
-    ig = resp2.get("instagram_business_account")
-    if not ig:
-        raise HTTPException(400, 'No Instagram business account linked.')
-    store_instagram_data(db=SessionLocal(),email=user_email.get('email'), facebook_page_id=page_id, instagram_user_id=ig['id'])
-    return ig['id']
-
-# --- Profile fetcher ---
-def _fetch_user_profile(ig_user_id: str, token: str) -> dict:
-    url = f"{BASE_URL}/{API_VERSION}/{ig_user_id}"
-    params = {
-        "fields": ",".join([
-            "username",
-            "profile_picture_url",
-            "followers_count",
-            "follows_count",
-            "biography",
-            "website",
-            "media_count"            # ← add media_count here
-        ]),
-        "access_token": token
-    }
-    resp = requests.get(url, params=params).json()
-    if 'followers_count' not in resp:
-        raise HTTPException(400, f"Profile error: {resp}")
-    return {
-        "username": resp["username"],
-        "profile_picture_url": resp["profile_picture_url"],
-        "followers_count": resp["followers_count"],
-        "follows_count": resp["follows_count"],
-        "bio": resp.get("biography"),
-        "link_in_bio": resp.get("website"),
-        "media_count": resp.get("media_count"),  # ← include it in the returned dict
-        "profile_views": None                       # ← you can set this later when you fetch insights
-    }
-def _fetch_profile_views(ig_user_id: str, token: str) -> Optional[int]:
-    url = f"{BASE_URL}/{API_VERSION}/{ig_user_id}/insights"
-    params = {
-        "metric": "profile_views",
-        "period": "day",
-        "access_token": token
-    }
-    resp = requests.get(url, params=params).json()
-    if "data" not in resp:
-        return None
-    # Get most recent day's value
-    try:
-        return resp["data"][0]["values"][-1]["value"]
-    except (KeyError, IndexError):
-        return None
-
-
-# --- Insight fetchers ---
-METRIC_DEFS = {
-    'time_series': 'follower_count,reach',
-    'total_values': 'views,accounts_engaged,comments,likes,saves,shares,total_interactions'
-}
-
-def _fetch_time_series(ig_user_id: str, token: str):
-    url = f"{BASE_URL}/{API_VERSION}/{ig_user_id}/insights"
-    params = {"metric": METRIC_DEFS['time_series'], "period": "day", "access_token": token}
-    resp = requests.get(url, params=params).json()
-    if 'data' not in resp:
-        raise HTTPException(400, f"Time series error: {resp}")
-    return resp['data']
-
-def _fetch_total_values(ig_user_id: str, token: str):
-    url = f"{BASE_URL}/{API_VERSION}/{ig_user_id}/insights"
-    params = {"metric": METRIC_DEFS['total_values'], "period": "day", "metric_type": "total_value", "access_token": token}
-    resp = requests.get(url, params=params).json()
-    if 'data' not in resp:
-        raise HTTPException(400, f"Total values error: {resp}")
-    return resp['data']
-
-# --- Media fetcher ---
-
-def _fetch_recent_media(ig_user_id: str, token: str) -> List[MediaItem]:
-    url = f"{BASE_URL}/{API_VERSION}/{ig_user_id}/media"
-    params = {
-        "fields": ",".join([
-            "id",
-            "caption",
-            "timestamp",
-            "media_type",
-            "like_count",
-            "comments_count",
-            "media_url",
-            "permalink",
-            "insights.metric(views,reach,saved,shares,impressions)"
-        ]),
-        "access_token": token
-    }
-    resp = requests.get(url, params=params).json()
-    items_data = []
-    for item in resp.get("data", []):
-        # flatten insights into top-level keys
-        insights = {m["name"]: m.get("values", [{}])[0].get("value") for m in item.get("insights", {}).get("data", [])}
-        item.update({
-            "saves_count": insights.get("saves", 0),
-            "shares_count": insights.get("shares", 0),
-            "reach": insights.get("reach"),
-            "impressions": insights.get("impressions"),
-        })
-        items_data.append(item)
-
-    # validate & coerce with Pydantic
-    return parse_obj_as(List[MediaItem], items_data)
-# --- Audience & Actions Insights fetchers ---
-def _fetch_daily_reach(ig_user_id: str, token: str) -> int:
-    url = f"{BASE_URL}/{API_VERSION}/{ig_user_id}/insights"
-    params = {"metric": "reach", "period": "day", "access_token": token}
-    resp = requests.get(url, params=params).json()
-    if 'data' not in resp:
-        raise HTTPException(400, f"Daily reach error: {resp}")
-    return resp['data'][0]['values'][0]['value']
 
 
-def _fetch_daily_views(ig_user_id: str, token: str) -> int:
-    url = f"{BASE_URL}/{API_VERSION}/{ig_user_id}/insights"
-    params = {"metric": "views", "period": "day", "metric_type": "total_value", "access_token": token}
-    resp = requests.get(url, params=params).json()
-    data = resp.get('data')
-    if not data or 'total_value' not in data[0]:
-        return 0
-    return data[0]['total_value'].get('value', 0)
+# --- Dashboard routes ---
+# The dashboard itself is built by app.services.instagram_dashboard
+SECTIONS_QUERY = Query(
+    None, description=f"Comma-separated sections to include (default all): {', '.join(DASHBOARD_SECTIONS)}"
+)
 
 
-def _fetch_online_followers(ig_user_id: str, token: str) -> int:
-    url = f"{BASE_URL}/{API_VERSION}/{ig_user_id}/insights"
-    params = {"metric": "online_followers", "period": "lifetime", "access_token": token}
-    resp = requests.get(url, params=params).json()
-    if 'data' not in resp:
-        raise HTTPException(400, f"Online followers error: {resp}")
-    return resp['data'][0]['values'][0]['value']
-
-
-def _fetch_profile_views(ig_user_id: str, token: str) -> int:
-    url = f"{BASE_URL}/{API_VERSION}/{ig_user_id}/insights"
-    params = {"metric": "profile_views", "period": "day", "metric_type": "total_value", "access_token": token}
-    resp = requests.get(url, params=params).json()
-    data = resp.get('data')
-    if not data or 'total_value' not in data[0]:
-        return 0
-    return data[0]['total_value'].get('value', 0)
-
-
-def _fetch_website_clicks(ig_user_id: str, token: str) -> int:
-    url = f"{BASE_URL}/{API_VERSION}/{ig_user_id}/insights"
-    params = {"metric": "website_clicks", "period": "day", "metric_type": "total_value", "access_token": token}
-    resp = requests.get(url, params=params).json()
-    data = resp.get('data')
-    if not data or 'total_value' not in data[0]:
-        return 0
-    return data[0]['total_value'].get('value', 0)
-
-# --- Route ---
 @router.post("/instagram/dashboard", response_model=DashboardData)
-def instagram_dashboard(email:UserEmail, db: Session = Depends(get_db)) -> DashboardData:
+async def instagram_dashboard(
+    email: UserEmail,
+    background_tasks: BackgroundTasks,
+    sections: Optional[str] = SECTIONS_QUERY,
+    db: AsyncSession = Depends(get_async_db),
+) -> DashboardData:
     """
-    Instagram dashboard endpoint.
-    - recent_media: all media with insights
-    - top_media: top 5 by impressions
+    Instagram dashboard endpoint. Serves the latest snapshot (prefetched or
+    from a previous request) until its hard TTL, rebuilding it after the
+    response once it is past the soft TTL. Without one it builds live and
+    stores the result as a new snapshot. With `sections`, only those
+    fields are returned (and, when built live, fetched).
     """
     email = email.email
     user_email['email'] = email   
-    token = get_instagram_token(db=db, email=email)
+    requested = parse_sections(sections, tuple(DASHBOARD_SECTIONS))
+    snapshot = await latest_snapshot_async(
+        db, email, "instagram", INSTAGRAM_PARAMS_KEY, SNAPSHOT_TTLS["instagram"][1]
+    )
+    if snapshot is not None:
+        if is_stale(snapshot):
+            schedule_revalidation(
+                background_tasks, email, "instagram", INSTAGRAM_PARAMS_KEY,
+                rebuild_instagram_snapshot, email,
+            )
+        if requested is None:
+            return snapshot_response(snapshot)
+        return Response(
+            content=dumps(snapshot_sections(snapshot, requested)),
+            media_type="application/json",
+            headers=snapshot_headers(snapshot),
+        )
+
+    dashboard = await build_instagram_dashboard(db, email, requested)
+    if requested is None:
+        body = dump_model(DashboardData, dashboard)
+        await run_in_threadpool(save_snapshot, email, "instagram", INSTAGRAM_PARAMS_KEY, body)
+    else:
+        # Partial builds aren't stored as snapshots
+        body = dump_model(DashboardData, dashboard, include=set(requested))
+    if FAST_JSON_RESPONSES:
+        return Response(content=body, media_type="application/json")
+    return dashboard
+
+
+@router.post("/instagram/dashboard/stream")
+async def instagram_dashboard_stream(
+    email: UserEmail,
+    background_tasks: BackgroundTasks,
+    sections: Optional[str] = SECTIONS_QUERY,
+    format: Optional[str] = Query(None, description="ndjson (default) | sse"),
+    accept: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_async_db),
+):
+    """
+    Same dashboard as /instagram/dashboard, sent section by section
+    (profile, total_followers, user_insights, audience_insights,
+    recent_media, top_media, engagement_rate) as the Graph calls and the
+    media sync finish. A usable snapshot is sent as one "snapshot" event
+    instead.
+    """
+    email = email.email
+    fmt = stream_format(format, accept)
+    requested = parse_sections(sections, tuple(DASHBOARD_SECTIONS))
+    snapshot = await latest_snapshot_async(
+        db, email, "instagram", INSTAGRAM_PARAMS_KEY, SNAPSHOT_TTLS["instagram"][1]
+    )
+    if snapshot is not None:
+        if is_stale(snapshot):
+            schedule_revalidation(
+                background_tasks, email, "instagram", INSTAGRAM_PARAMS_KEY,
+                rebuild_instagram_snapshot, email,
+            )
+        data = snapshot.payload if requested is None else snapshot_sections(snapshot, requested)
+        return section_stream([("snapshot", data)], fmt, snapshot_headers(snapshot))
+
+    # The account is read up front; the stream itself doesn't use this session
+    token, ig_user_id = await get_instagram_account(db=db, email=email)
     if not token:
         raise HTTPException(401, "No Instagram token; please connect your account.")
-    ig_user_id = _get_ig_user_id(token)
+    return section_stream(iter_instagram_sections(email, token, ig_user_id, requested), fmt)
 
-    # Fetch profile and profile views, merge them
-    profile_data = _fetch_user_profile(ig_user_id, token)
-    profile_views = _fetch_profile_views(ig_user_id, token)
-    profile_data["profile_views"] = profile_views
-    profile = ProfileOverview(**profile_data)
+IG_HISTORY_DEFAULT_DAYS = int(os.getenv("IG_HISTORY_DEFAULT_DAYS", "90"))
 
-    ts = _fetch_time_series(ig_user_id, token)
-    tv = _fetch_total_values(ig_user_id, token)
-    dates = [pt['end_time'][:10] for pt in ts[0]['values']]
-    
-    insights = []
-    for idx, dt in enumerate(dates):
-        row = {m['name']: m['values'][idx]['value'] for m in ts}
-        for m in tv:
-            row[m['name']] = m.get('total_value', {}).get('value', 0)
-        insights.append(UserInsights(date=dt, **row))
 
-    media = _fetch_recent_media(ig_user_id, token)
-
-    # Compute engagement rate
-    if media and profile.followers_count:
-        total_engagements = sum(m.like_count + m.comments_count for m in media)
-        engagement_rate = round((total_engagements / (len(media) * profile.followers_count)) * 100, 2)
-    else:
-        engagement_rate = None
-
-    # Compute top media by impressions
-    top_media = sorted(media, key=lambda m: m.impressions or 0, reverse=True)[:5]
-
-    # Audience insights
-    audience = AudienceInsights(
-        reach=_fetch_daily_reach(ig_user_id, token),
-        views=_fetch_daily_views(ig_user_id, token),
-        online_followers=_fetch_online_followers(ig_user_id, token),
-        profile_views=profile_views,
-        website_clicks=_fetch_website_clicks(ig_user_id, token)
-    )
+@router.post("/insights/history")
+async def instagram_insights_history(
+    email: UserEmail,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db),
+):
+    """
+    Stored daily insights for long-range charts, as columnar arrays
+    (one list per UserInsights field, aligned with "date"). Served from
+    the local snapshots only; days are added by dashboard fetches.
+    """
+    _, ig_user_id = await get_instagram_account(db=db, email=email.email)
+    if not ig_user_id:
+        raise HTTPException(404, "No Instagram account stored; open the dashboard first.")
+    try:
+        end = date.fromisoformat(end_date) if end_date else datetime.utcnow().date()
+        start = date.fromisoformat(start_date) if start_date else end - timedelta(days=IG_HISTORY_DEFAULT_DAYS)
+    except ValueError:
+        raise HTTPException(400, "Invalid date format. Use YYYY-MM-DD")
+    if start > end:
+        raise HTTPException(400, "start_date must be before end_date")
+    return {
+        "start_date": start.isoformat(),
+        "end_date": end.isoformat(),
+        "insights": await run_in_threadpool(read_insights_range, ig_user_id, start, end),
+    }
 
-    return DashboardData(
-        profile=profile,
-        user_insights=insights,
-        recent_media=media,
-        top_media=top_media,
-        total_followers=profile.followers_count,
-        audience_insights=audience,
-        engagement_rate=engagement_rate
-    )
 
 @router.post("/disconnect")
-def disconnect_instagram(email: UserEmail, db: Session = Depends(get_db)):
+async def disconnect_instagram(email: UserEmail, db: AsyncSession = Depends(get_async_db)):
     try:
         # Get credentials
-        token = get_instagram_token(db=db, email=email.email)
+        token = await get_instagram_token(db=db, email=email.email)
         if not token:
             raise HTTPException(401, "No Instagram token; please connect your account.")
         
         # Revoke the credentials if they're valid
         revoke_url = f"{BASE_URL}/{API_VERSION}/me/permissions"
         params = {"access_token": token}
-        resp = requests.delete(revoke_url, params=params).json()
+        resp = (await get_async_client().delete(revoke_url, params=params)).json()
         
         # Update the user information in the database
-        user = db.query(User).filter_by(email=email.email).first()
+        user = (await db.execute(select(User).filter_by(email=email.email))).scalars().first()
         if user:
             user.ig_is_connected = False
             user.access_token = None
             user.instagram_user_id = None
             user.facebook_page_id = None
             user.instagram_page_name = None
+            await db.execute(clear_snapshots(user.id, "instagram"))
 
-            db.commit()
+            await db.commit()
+            invalidate_user(user.id)
             return {"message": "Instagram account disconnected successfully."}
         else:
             raise HTTPException(404, "User not found.")
@@ -0,0 +1,37 @@
+# app/api/v1/endpoints/ops.py
+#
+# Operational read-outs for the running worker (cache counters, HTTP and DB pools,
+# request coalescing etc.).
+
+from fastapi import APIRouter
+
+from app.core.cache import cache_stats
+from app.core.http import pool_stats
+from app.core.singleflight import singleflight_stats
+from app.db.pool_metrics import pool_metrics
+
+router = APIRouter()
+
+
+@router.get("/caches")
+def get_cache_stats():
+    """Hit/miss counters and sizes for the in-process caches of this worker."""
+    return cache_stats()
+
+
+@router.get("/http-pools")
+def get_http_pool_stats():
+    """Connection pool sizes and per-host connection counts for the shared HTTP clients."""
+    return pool_stats()
+
+
+@router.get("/db-pools")
+def get_db_pool_stats():
+    """Checkout latency, wait and hold times, in-use and overflow counts for the DB pools."""
+    return pool_metrics()
+
+
+@router.get("/singleflight")
+def get_singleflight_stats():
+    """In-flight and shared call counts for the request-coalescing groups."""
+    return singleflight_stats()
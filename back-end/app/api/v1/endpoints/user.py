@@ -1,15 +1,15 @@
 from datetime import datetime, timedelta
 from fastapi import APIRouter, Depends, HTTPException, status
 from pydantic import BaseModel
-from sqlalchemy.orm import Session
-from app import db
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.models.models import User
-from app.db.session import SessionLocal, get_db  # Import the session
+from app.db.session import get_async_db  # Per-request async session
+from app.services.auth_cache import cached_claims, cached_user, store_claims, store_user
 import hashlib
 import os
 from jose import JWTError, jwt
 router = APIRouter()
-db = SessionLocal()
 class UserSignup(BaseModel):
     email: str
     password: str
@@ -24,12 +24,12 @@ def hash_password(password: str, salt: bytes) -> str:
     return hashlib.sha256(salt + password.encode()).hexdigest()
 
 @router.post("/signup", status_code=status.HTTP_201_CREATED)
-async def signup(user: UserSignup, db: Session = Depends(get_db)):
+async def signup(user: UserSignup, db: AsyncSession = Depends(get_async_db)):
     # Normalize email
     email = user.email.lower()
     
     # Check if email exists
-    existing_user = db.query(User).filter_by(email=email).first()
+    existing_user = (await db.execute(select(User.id).filter_by(email=email))).first()
     if existing_user:
         raise HTTPException(
             status_code=status.HTTP_409_CONFLICT,
@@ -49,8 +49,7 @@ async def signup(user: UserSignup, db: Session = Depends(get_db)):
     )
     
     db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    await db.commit()
     
     return {"message": "User created successfully"}
 
@@ -67,12 +66,12 @@ def create_access_token(data: dict):
     return encoded_jwt
 
 @router.post("/login")
-async def login(user: UserLogin, db: Session = Depends(get_db)):
+async def login(user: UserLogin, db: AsyncSession = Depends(get_async_db)):
     # Normalize email
     email = user.email.lower()
     
     # Find user
-    db_user = db.query(User).filter_by(email=email).first()
+    db_user = (await db.execute(select(User).filter_by(email=email))).scalars().first()
     if not db_user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -120,26 +119,41 @@ from fastapi.security import OAuth2PasswordBearer
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
-async def get_current_user(token: str = Depends(oauth2_scheme)):
+async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_async_db)):
+    # Verified claims and the user projection are cached; see app/services/auth_cache.py
+    payload = cached_claims(token)
+    if payload is None:
+        try:
+            payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        except JWTError:
+            raise HTTPException(status_code=401, detail="Invalid credentials")
+        store_claims(token, payload)
+
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         user_id = payload.get("sub")
         if user_id is None:
             raise HTTPException(status_code=401, detail="Invalid credentials")
-    except JWTError:
+        # asyncpg won't coerce a str bind to the integer id column
+        user_id = int(user_id)
+    except ValueError:
         raise HTTPException(status_code=401, detail="Invalid credentials")
     
-    user = db.query(User).filter(User.id == user_id).first()
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
+    current_user = cached_user(user_id)
+    if current_user is None:
+        user = await db.get(User, user_id)
+        if not user:
+            raise HTTPException(status_code=404, detail="User not found")
+        current_user = {
+            "id": str(user.id),
+            "username": user.username,
+            "email": user.email,
+            'ig_is_connected': str(user.ig_is_connected),
+            'yt_is_connected': str(user.yt_is_connected),
+        }
+        store_user(user_id, current_user)
     
-    return {
-        "id": str(user.id),
-        "username": user.username,
-        "email": user.email,
-        'ig_is_connected': str(user.ig_is_connected),
-        'yt_is_connected': str(user.yt_is_connected),
-    }
+    # Copy so callers can't modify the cached entry
+    return dict(current_user)
 
 @router.get("/me")
 async def read_current_user(current_user: dict = Depends(get_current_user)):
@@ -1,23 +1,48 @@
 # app/api/v1/endpoints/yt_metrics.py (updated)
 
+import json
 import os
   # loads environment variables from .env into os.environ
 
-from fastapi import APIRouter, HTTPException, Query, Depends
-from dateutil.relativedelta import relativedelta
+from fastapi import APIRouter, BackgroundTasks, Header, HTTPException, Query, Depends
 from typing import Optional
-from fastapi.responses import RedirectResponse
+from fastapi.responses import RedirectResponse, Response
 from pydantic import BaseModel 
 from app.services.yt_analytics_v2 import (
+    clear_cached_services,
     fetch_dashboard_data,
     get_services,
+    DASHBOARD_SECTIONS,
     get_authorization_url,
+    iter_dashboard_sections,
+    rebuild_youtube_snapshot,
+    resolve_date_range,
     validate_authorization_code,
-    validate_dates
 )
-from app.db.session import SessionLocal
+from app.services.dashboard_snapshots import (
+    SNAPSHOT_TTLS,
+    clear_snapshots,
+    is_stale,
+    latest_snapshot,
+    parse_sections,
+    save_snapshot,
+    schedule_revalidation,
+    snapshot_headers,
+    snapshot_response,
+    snapshot_sections,
+    youtube_params_key,
+)
+from app.services.auth_cache import invalidate_user
+from app.services.yt_catalog import clear_channel
+from app.services.yt_rollup import ROLLUP_FREQUENCIES, rollup_daily_metrics
+from app.core.http import get_async_client
+from app.core.serialization import FAST_JSON_RESPONSES, FastJSONResponse, dumps
+from app.core.streaming import section_stream, stream_format
+from app.db.session import get_async_db
 from app.models.models import User
-import requests
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+import httpx
 # In yt_analytics_v2.py
 from google.auth.exceptions import RefreshError  # Add this import
 
@@ -60,83 +85,164 @@ async def initiate_youtube_auth(email: UserEmail):
 @router.get("/auth/callback")
 async def youtube_auth_callback(code: str):
     email = _email['email']
-    success = validate_authorization_code(code, email)
+    success = await validate_authorization_code(code, email)
     if not success:
         raise HTTPException(400, "Invalid authorization code")
     return RedirectResponse(url=FE_YOUTUBE_REDIRECT_URI)
 
-from datetime import datetime, timedelta
-from dateutil.relativedelta import relativedelta
+
+def _apply_rollup(data: dict, rollup: Optional[str]) -> dict:
+    if rollup and "channel_metrics" in data:
+        return {**data, "channel_metrics": rollup_daily_metrics(data["channel_metrics"], rollup)}
+    return data
+
+
+SECTIONS_QUERY = Query(
+    None, description=f"Comma-separated sections to include (default all): {', '.join(DASHBOARD_SECTIONS)}"
+)
+
 
 @router.post("/yt-metrics")
 def get_yt_metrics(
     email: UserEmail,
+    background_tasks: BackgroundTasks,
     frequency: Optional[str] = Query('daily'),
     start_date: Optional[str] = None,
-    end_date: Optional[str] = None
+    end_date: Optional[str] = None,
+    rollup: Optional[str] = Query(None, description="Aggregate channel_metrics rows into daily|weekly|monthly|yearly buckets"),
+    sections: Optional[str] = SECTIONS_QUERY,
 ):
     email__ = email.email
     try:
-        # Default end_date to 2 days ago (YouTube data delay)
-        today = datetime.utcnow().date()
-        max_end_date = today - timedelta(days=2)
-        end_date = end_date or max_end_date.isoformat()
+        if rollup and rollup not in ROLLUP_FREQUENCIES:
+            raise HTTPException(400, "Invalid rollup parameter")
+        requested = parse_sections(sections, DASHBOARD_SECTIONS)
 
-        # Validate end_date first
-        try:
-            end_date_obj = datetime.strptime(end_date, "%Y-%m-%d").date()
-        except ValueError:
-            raise HTTPException(400, "Invalid end_date format. Use YYYY-MM-DD")
-
-        # Calculate start_date based on frequency if not provided
-        if not start_date:
-            if frequency == "weekly":
-                start_date_obj = end_date_obj - timedelta(weeks=1)
-            elif frequency == "monthly":
-                start_date_obj = end_date_obj - relativedelta(months=1)
-            elif frequency == "yearly":
-                start_date_obj = end_date_obj - relativedelta(years=1)
-            elif frequency == "daily":
-                start_date_obj = end_date_obj - timedelta(days=1)
+        start_date, end_date = resolve_date_range(frequency, start_date, end_date)
+
+        # Serve the prefetched/previous build until its hard TTL; past the
+        # soft TTL it is rebuilt after this response
+        params_key = youtube_params_key(start_date, end_date)
+        snapshot = latest_snapshot(email__, "youtube", params_key, SNAPSHOT_TTLS["youtube"][1])
+        if snapshot is not None:
+            if is_stale(snapshot):
+                schedule_revalidation(
+                    background_tasks, email__, "youtube", params_key,
+                    rebuild_youtube_snapshot, email__, start_date, end_date,
+                )
+            if not rollup and requested is None:
+                return snapshot_response(snapshot)
+            if requested is None:
+                data = json.loads(snapshot.payload)
             else:
-                raise HTTPException(400, "Invalid frequency parameter")
-            
-            start_date = start_date_obj.isoformat()
+                data = snapshot_sections(snapshot, requested)
+            return Response(
+                content=dumps(_apply_rollup(data, rollup)),
+                media_type="application/json",
+                headers=snapshot_headers(snapshot),
+            )
+        if requested is not None:
+            # Only the requested reports run; partial builds aren't stored as snapshots
+            data = fetch_dashboard_data(email__, start_date, end_date, sections=requested)
+        else:
+            data = fetch_dashboard_data(email__, start_date, end_date)
+            body = dumps(data)
+            save_snapshot(email__, "youtube", params_key, body)
+            if not rollup and FAST_JSON_RESPONSES:
+                return Response(content=body, media_type="application/json")
 
-        # Now validate both dates
-        start_date, end_date = validate_dates(start_date, end_date)
-        
-        return fetch_dashboard_data(email__, start_date, end_date)
+        data = _apply_rollup(data, rollup)
+        if FAST_JSON_RESPONSES:
+            # Plain dicts straight from the API; skip jsonable_encoder
+            return FastJSONResponse(data)
+        return data
     except HTTPException as e:
         raise e
     except Exception as e:
         raise HTTPException(502, detail=str(e))
 
+def _stream_live_sections(
+    email: str, start_date: str, end_date: str, rollup: Optional[str], requested: Optional[tuple]
+):
+    data = {}
+    for section, fragment in iter_dashboard_sections(email, start_date, end_date, requested):
+        data.update(fragment)
+        yield section, _apply_rollup(fragment, rollup)
+    if requested is None:
+        save_snapshot(email, "youtube", youtube_params_key(start_date, end_date), dumps(data))
+
+
+def _stream_snapshot(snapshot, rollup: Optional[str], requested: Optional[tuple]):
+    if not rollup and requested is None:
+        yield "snapshot", snapshot.payload
+        return
+    data = json.loads(snapshot.payload) if requested is None else snapshot_sections(snapshot, requested)
+    yield "snapshot", _apply_rollup(data, rollup)
+
+
+@router.post("/yt-metrics/stream")
+def stream_yt_metrics(
+    email: UserEmail,
+    background_tasks: BackgroundTasks,
+    frequency: Optional[str] = Query('daily'),
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    rollup: Optional[str] = Query(None, description="Aggregate channel_metrics rows into daily|weekly|monthly|yearly buckets"),
+    sections: Optional[str] = SECTIONS_QUERY,
+    format: Optional[str] = Query(None, description="ndjson (default) | sse"),
+    accept: Optional[str] = Header(None),
+):
+    """
+    Same dashboard as /yt-metrics, sent section by section (channel_info,
+    channel_metrics, top_videos, demographics, traffic_sources, geography)
+    as each report finishes. A usable snapshot is sent as one "snapshot"
+    event instead.
+    """
+    email__ = email.email
+    fmt = stream_format(format, accept)
+    if rollup and rollup not in ROLLUP_FREQUENCIES:
+        raise HTTPException(400, "Invalid rollup parameter")
+    requested = parse_sections(sections, DASHBOARD_SECTIONS)
+    start_date, end_date = resolve_date_range(frequency, start_date, end_date)
+
+    params_key = youtube_params_key(start_date, end_date)
+    snapshot = latest_snapshot(email__, "youtube", params_key, SNAPSHOT_TTLS["youtube"][1])
+    if snapshot is not None:
+        if is_stale(snapshot):
+            schedule_revalidation(
+                background_tasks, email__, "youtube", params_key,
+                rebuild_youtube_snapshot, email__, start_date, end_date,
+            )
+        return section_stream(_stream_snapshot(snapshot, rollup, requested), fmt, snapshot_headers(snapshot))
+    return section_stream(_stream_live_sections(email__, start_date, end_date, rollup, requested), fmt)
+
+
 @router.post("/disconnect")
-def disconnect_youtube(email: UserEmail):
-    db = SessionLocal()
+async def disconnect_youtube(email: UserEmail, db: AsyncSession = Depends(get_async_db)):
     email = email.email
-    try:
-        user = db.query(User).filter_by(email=email).first()
-        if not user:
-            raise HTTPException(404, "User not found")
-        
-        if user.yt_token:
-            # Revoke Google credentials
-            creds = Credentials(token=user.yt_token)
-            try:
-                revoke_url = "https://oauth2.googleapis.com/revoke"
-                requests.post(revoke_url, params={'token': creds.token})
-            except requests.exceptions.RequestException:
-                pass
-            
-            # Clear user data
-            user.yt_token = None
-            user.yt_refresh_token = None
-            user.yt_expiry = None
-            user.yt_is_connected = False
-            db.commit()
+    user = (await db.execute(select(User).filter_by(email=email))).scalars().first()
+    if not user:
+        raise HTTPException(404, "User not found")
+    
+    if user.yt_token:
+        # Revoke Google credentials
+        creds = Credentials(token=user.yt_token)
+        try:
+            revoke_url = "https://oauth2.googleapis.com/revoke"
+            await get_async_client().post(revoke_url, params={'token': creds.token})
+        except httpx.HTTPError:
+            pass
         
-        return {"message": "YouTube disconnected successfully"}
-    finally:
-        db.close()
\ No newline at end of file
+        # Clear user data
+        user.yt_token = None
+        user.yt_refresh_token = None
+        user.yt_expiry = None
+        user.yt_is_connected = False
+        await db.execute(clear_snapshots(user.id, "youtube"))
+        for statement in clear_channel(user.id):
+            await db.execute(statement)
+        await db.commit()
+        clear_cached_services(email)
+        invalidate_user(user.id)
+    
+    return {"message": "YouTube disconnected successfully"}
\ No newline at end of file
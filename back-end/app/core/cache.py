@@ -0,0 +1,94 @@
+# app/core/cache.py
+#
+# Small in-process caches shared by the services. Every cache registers
+# itself by name so its counters show up under /ops/caches.
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+_registry: Dict[str, "TTLCache"] = {}
+_MISSING = object()
+
+
+class TTLCache:
+    """Thread-safe LRU cache with an optional TTL per entry and hit/miss counters.
+
+    A ttl of None keeps the entry until it is evicted as least recently used.
+    get_with_age also reports how long ago an entry was stored, for callers
+    that apply a shorter freshness window on top of the ttl.
+    """
+
+    def __init__(self, name: str, maxsize: int):
+        self.name = name
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[Hashable, Tuple[Any, Optional[float], float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        _registry[name] = self
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        entry = self.get_with_age(key)
+        return default if entry is None else entry[0]
+
+    def get_with_age(self, key: Hashable) -> Optional[Tuple[Any, float]]:
+        """(value, seconds since it was stored) for a live entry, else None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, expires_at, stored_at = entry
+                now = time.monotonic()
+                if expires_at is None or expires_at > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value, now - stored_at
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        now = time.monotonic()
+        expires_at = None if ttl is None else now + ttl
+        with self._lock:
+            self._entries[key] = (value, expires_at, now)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def get_or_load(self, key: Hashable, loader: Callable[[], Any], ttl: Optional[float] = None) -> Any:
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = loader()
+            self.set(key, value, ttl)
+        return value
+
+    def invalidate(self, key: Hashable) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def invalidate_where(self, predicate: Callable[[Hashable], bool]) -> None:
+        with self._lock:
+            for key in [key for key in self._entries if predicate(key)]:
+                del self._entries[key]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+            }
+
+
+def cache_stats() -> Dict[str, dict]:
+    """Counters for every registered cache, keyed by cache name."""
+    return {name: cache.stats() for name, cache in _registry.items()}
@@ -0,0 +1,148 @@
+# app/core/http.py
+#
+# Shared outbound HTTP clients. Every upstream call (Graph API, Google OAuth,
+# googleapiclient) goes through one of these so a worker keeps warm
+# keep-alive connections per host instead of opening a new TCP/TLS
+# connection for each request.
+#
+#   get_session()       pooled requests.Session for sync code
+#   get_async_client()  pooled httpx.AsyncClient (HTTP/2 when h2 is installed)
+#   get_httplib2()      per-thread httplib2.Http for googleapiclient
+
+import os
+import threading
+import weakref
+from typing import Optional
+
+import httplib2
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))
+HTTP_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", "15"))
+# Hosts kept in the sync pool manager, and connections kept per host
+HTTP_POOL_HOSTS = int(os.getenv("HTTP_POOL_HOSTS", "10"))
+HTTP_POOL_MAXSIZE = int(os.getenv("HTTP_POOL_MAXSIZE", "20"))
+# Async client limits (across all hosts)
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE", "20"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30"))
+
+try:
+    import h2  # noqa: F401  (enables httpx HTTP/2 support)
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+HTTP2_ENABLED = HTTP2_AVAILABLE and os.getenv("HTTP_HTTP2", "true").lower() == "true"
+
+
+class _TimeoutSession(requests.Session):
+    """requests.Session that applies the default timeouts when none are given."""
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault("timeout", (HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT))
+        return super().request(method, url, **kwargs)
+
+
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
+_async_client: Optional[httpx.AsyncClient] = None
+_thread_http = threading.local()
+_httplib2_instances: "weakref.WeakSet[httplib2.Http]" = weakref.WeakSet()
+
+
+def get_session() -> requests.Session:
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = _TimeoutSession()
+                adapter = HTTPAdapter(pool_connections=HTTP_POOL_HOSTS, pool_maxsize=HTTP_POOL_MAXSIZE)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                _session = session
+    return _session
+
+
+def get_async_client() -> httpx.AsyncClient:
+    # Created lazily inside the worker's event loop
+    global _async_client
+    if _async_client is None:
+        _async_client = httpx.AsyncClient(
+            http2=HTTP2_ENABLED,
+            timeout=httpx.Timeout(HTTP_READ_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT),
+            limits=httpx.Limits(
+                max_connections=HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+                keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+            ),
+        )
+    return _async_client
+
+
+def get_httplib2() -> httplib2.Http:
+    """httplib2 isn't thread-safe, so each thread keeps its own keep-alive Http."""
+    http = getattr(_thread_http, "http", None)
+    if http is None:
+        http = _thread_http.http = httplib2.Http(timeout=HTTP_READ_TIMEOUT)
+        _httplib2_instances.add(http)
+    return http
+
+
+async def close_http_clients() -> None:
+    global _async_client, _session
+    if _async_client is not None:
+        await _async_client.aclose()
+        _async_client = None
+    if _session is not None:
+        _session.close()
+        _session = None
+
+
+def pool_stats() -> dict:
+    """Connection counts for each shared client, per host where available."""
+    stats = {
+        "config": {
+            "connect_timeout": HTTP_CONNECT_TIMEOUT,
+            "read_timeout": HTTP_READ_TIMEOUT,
+            "pool_hosts": HTTP_POOL_HOSTS,
+            "pool_maxsize": HTTP_POOL_MAXSIZE,
+            "max_connections": HTTP_MAX_CONNECTIONS,
+            "max_keepalive": HTTP_MAX_KEEPALIVE,
+            "http2": HTTP2_ENABLED,
+        },
+        "requests": {},
+        "httpx": {},
+        "httplib2": {},
+    }
+
+    if _session is not None:
+        adapter = _session.get_adapter("https://")
+        pools = adapter.poolmanager.pools
+        for key in list(pools.keys()):
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            stats["requests"][f"{pool.scheme}://{pool.host}"] = {
+                "connections_opened": pool.num_connections,
+                "requests": pool.num_requests,
+                # the queue is padded with None placeholders for unopened slots
+                "idle": sum(1 for conn in list(pool.pool.queue) if conn is not None) if pool.pool is not None else 0,
+                "maxsize": pool.pool.maxsize if pool.pool is not None else 0,
+            }
+
+    if _async_client is not None:
+        # httpcore keeps its connection list on the transport's pool
+        connections = getattr(getattr(_async_client._transport, "_pool", None), "connections", [])
+        for connection in connections:
+            origin = str(connection._origin) if hasattr(connection, "_origin") else "unknown"
+            host = stats["httpx"].setdefault(origin, {"connections": 0, "idle": 0})
+            host["connections"] += 1
+            host["idle"] += int(connection.is_idle())
+
+    for http in list(_httplib2_instances):
+        for key in list(http.connections):
+            host = key.split(":", 1)[-1]
+            stats["httplib2"][host] = stats["httplib2"].get(host, 0) + 1
+    return stats
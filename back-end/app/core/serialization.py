@@ -0,0 +1,53 @@
+# app/core/serialization.py
+#
+# Fast response path. FastAPI validates whatever an endpoint returns against
+# its response_model a second time and then JSON-encodes it; returning a
+# Response from here skips both. Payloads are validated once through a cached
+# pydantic TypeAdapter and serialized by pydantic-core (models) or orjson
+# (plain dicts), falling back to the stdlib json module without orjson.
+#
+# FAST_JSON_RESPONSES=false returns endpoints to FastAPI's default path.
+
+import json
+import os
+from functools import lru_cache
+from typing import Any
+
+from fastapi.responses import JSONResponse
+from pydantic import TypeAdapter
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+FAST_JSON_RESPONSES = os.getenv("FAST_JSON_RESPONSES", "true").lower() == "true"
+
+
+@lru_cache(maxsize=None)
+def type_adapter(tp: Any) -> TypeAdapter:
+    # Building an adapter compiles a validator/serializer; do it once per type
+    return TypeAdapter(tp)
+
+
+def validate(tp: Any, data: Any) -> Any:
+    return type_adapter(tp).validate_python(data)
+
+
+def dumps(content: Any) -> bytes:
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(content, default=str, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(content, default=str, separators=(",", ":")).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered with orjson when it is installed."""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def dump_model(tp: Any, value: Any, **kwargs) -> bytes:
+    """JSON bytes for an already-validated `value` of type `tp` (kwargs go to dump_json, e.g. include)."""
+    return type_adapter(tp).dump_json(value, by_alias=True, **kwargs)
@@ -0,0 +1,125 @@
+# app/core/singleflight.py
+#
+# Request coalescing for upstream fetches. While a call for a key is in
+# flight, other callers with the same key wait for it and share its result
+# (or exception) instead of starting their own, so duplicate requests from
+# several tabs or a double mount cost one upstream fetch.
+#
+#   SingleFlight       for sync code running on threads (def endpoints, pools)
+#   AsyncSingleFlight  for coroutines on one event loop (async def endpoints)
+#
+# Each group registers itself by name so its counters show up under
+# /ops/singleflight.
+
+import asyncio
+import threading
+from typing import Any, Awaitable, Callable, Dict, Hashable, Union
+
+_registry: Dict[str, Union["SingleFlight", "AsyncSingleFlight"]] = {}
+
+
+class _Counters:
+    def __init__(self, name: str):
+        self.name = name
+        self.calls = 0
+        self.shared = 0
+        _registry[name] = self
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": len(self._calls),
+            "calls": self.calls,
+            "shared": self.shared,
+            "share_rate": round(self.shared / self.calls, 4) if self.calls else None,
+        }
+
+
+class _Call:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight(_Counters):
+    """Coalesces concurrent do(key, fn) calls across threads."""
+
+    def __init__(self, name: str):
+        self._calls: Dict[Hashable, _Call] = {}
+        self._lock = threading.Lock()
+        super().__init__(name)
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        with self._lock:
+            self.calls += 1
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                self.shared += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+
+class AsyncSingleFlight(_Counters):
+    """Coalesces concurrent `await do(key, fn)` calls on the running event loop.
+
+    The first caller awaits fn() itself. If it is cancelled (e.g. the client
+    went away), a waiting caller takes over rather than failing with it.
+    """
+
+    def __init__(self, name: str):
+        self._calls: Dict[Hashable, asyncio.Future] = {}
+        super().__init__(name)
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        self.calls += 1
+        while key in self._calls:
+            future = self._calls[key]
+            self.shared += 1
+            try:
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    raise
+                self.shared -= 1
+
+        future = asyncio.get_running_loop().create_future()
+        self._calls[key] = future
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            future.exception()  # retrieved here; waiters re-raise it themselves
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            del self._calls[key]
+
+
+def singleflight_stats() -> Dict[str, dict]:
+    """Counters for every registered group, keyed by name."""
+    return {name: group.stats() for name, group in _registry.items()}
@@ -0,0 +1,86 @@
+# app/core/streaming.py
+#
+# Progressive dashboard responses. Each section is sent as one event as
+# soon as it is ready:
+#
+#   {"section": "<name>", "data": {...}}
+#
+# where data is a fragment of the regular (non-streaming) response body, so
+# merging the fragments in order rebuilds it. A stream ends with a "done"
+# event, or an "error" event ({"status_code", "detail"}) when a fetch fails
+# after the headers went out.
+#
+# NDJSON (one event per line) by default; Server-Sent Events with
+# format=sse or an Accept: text/event-stream request header.
+
+from typing import Any, AsyncIterable, Iterable, Optional, Tuple, Union
+
+from fastapi import HTTPException
+from starlette.responses import StreamingResponse
+
+from app.core.serialization import dumps
+
+STREAM_MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "sse": "text/event-stream",
+}
+
+Event = Tuple[str, Any]
+
+
+def stream_format(format: Optional[str], accept: Optional[str]) -> str:
+    if format is None:
+        return "sse" if accept and "text/event-stream" in accept else "ndjson"
+    if format not in STREAM_MEDIA_TYPES:
+        raise HTTPException(400, f"Invalid format; use one of {', '.join(STREAM_MEDIA_TYPES)}")
+    return format
+
+
+def encode_event(fmt: str, section: str, data: Any) -> bytes:
+    """One event; `data` may already be JSON bytes (e.g. a stored snapshot)."""
+    payload = data if isinstance(data, bytes) else dumps(data)
+    body = b'{"section":' + dumps(section) + b',"data":' + payload + b"}"
+    if fmt == "sse":
+        return b"event: " + section.encode() + b"\ndata: " + body + b"\n\n"
+    return body + b"\n"
+
+
+def _error_event(exc: Exception) -> Event:
+    if isinstance(exc, HTTPException):
+        return "error", {"status_code": exc.status_code, "detail": exc.detail}
+    return "error", {"status_code": 502, "detail": str(exc)}
+
+
+def section_stream(
+    events: Union[Iterable[Event], AsyncIterable[Event]], fmt: str, headers: Optional[dict] = None
+) -> StreamingResponse:
+    """Stream (section, fragment) pairs from a sync or async iterator.
+
+    Sync iterators are advanced on the threadpool by Starlette, so they may
+    block on upstream calls.
+    """
+    if hasattr(events, "__aiter__"):
+        async def body():
+            try:
+                async for section, data in events:
+                    yield encode_event(fmt, section, data)
+            except Exception as e:
+                yield encode_event(fmt, *_error_event(e))
+                return
+            yield encode_event(fmt, "done", {})
+    else:
+        def body():
+            try:
+                for section, data in events:
+                    yield encode_event(fmt, section, data)
+            except Exception as e:
+                yield encode_event(fmt, *_error_event(e))
+                return
+            yield encode_event(fmt, "done", {})
+
+    return StreamingResponse(
+        body(),
+        media_type=STREAM_MEDIA_TYPES[fmt],
+        # Keep proxies from buffering the events
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no", **(headers or {})},
+    )
@@ -0,0 +1,171 @@
+# app/db/pool_metrics.py
+#
+# Connection pool instrumentation. Each engine gets a pool subclass that
+# times every checkout, and separately the time spent waiting for a free
+# (or new) connection inside the pool. Engine events also time how long each
+# connection is held. Counters and recent-sample percentiles show up under
+# /ops/db-pools, so pool size can be checked against worker counts and
+# starvation shows up as wait time and timeouts.
+
+import threading
+import time
+from collections import deque
+from typing import Dict, Type
+
+from sqlalchemy import event, exc
+from sqlalchemy.pool import Pool
+
+# Recent samples kept per series for the percentiles
+POOL_METRIC_SAMPLES = 1024
+
+_registry: Dict[str, "PoolMetrics"] = {}
+
+
+def _summary(samples: deque) -> dict:
+    if not samples:
+        return {"count": 0}
+    ordered = sorted(samples)
+    last = len(ordered) - 1
+    return {
+        "count": len(ordered),
+        "avg_ms": round(sum(ordered) / len(ordered), 3),
+        "p50_ms": round(ordered[last // 2], 3),
+        "p95_ms": round(ordered[int(last * 0.95)], 3),
+        "p99_ms": round(ordered[int(last * 0.99)], 3),
+        "max_ms": round(ordered[last], 3),
+    }
+
+
+class PoolMetrics:
+    """Checkout counters and timings for one engine's pool."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.pool: Pool = None
+        self.pool_class = None
+        self.checkouts = 0
+        self.overflow_checkouts = 0
+        self.timeouts = 0
+        self.connects = 0
+        self.peak_checked_out = 0
+        self._checkout_ms: deque = deque(maxlen=POOL_METRIC_SAMPLES)
+        self._wait_ms: deque = deque(maxlen=POOL_METRIC_SAMPLES)
+        self._hold_ms: deque = deque(maxlen=POOL_METRIC_SAMPLES)
+        self._lock = threading.Lock()
+        _registry[name] = self
+
+    def record_wait(self, ms: float, overflowed: bool) -> None:
+        with self._lock:
+            self._wait_ms.append(ms)
+            self.overflow_checkouts += overflowed
+
+    def record_checkout(self, ms: float, checked_out: int) -> None:
+        with self._lock:
+            self.checkouts += 1
+            self._checkout_ms.append(ms)
+            self.peak_checked_out = max(self.peak_checked_out, checked_out)
+
+    def record_hold(self, ms: float) -> None:
+        with self._lock:
+            self._hold_ms.append(ms)
+
+    def record_timeout(self) -> None:
+        with self._lock:
+            self.timeouts += 1
+
+    def record_connect(self) -> None:
+        with self._lock:
+            self.connects += 1
+
+    def stats(self) -> dict:
+        pool = self.pool
+        with self._lock:
+            stats = {
+                "pool_class": self.pool_class,
+                "checkouts": self.checkouts,
+                "overflow_checkouts": self.overflow_checkouts,
+                "timeouts": self.timeouts,
+                "connections_opened": self.connects,
+                "peak_in_use": self.peak_checked_out,
+                "checkout_latency": _summary(self._checkout_ms),
+                "wait_time": _summary(self._wait_ms),
+                "hold_time": _summary(self._hold_ms),
+            }
+        if pool is not None and hasattr(pool, "checkedout"):
+            stats.update({
+                "size": pool.size(),
+                "in_use": pool.checkedout(),
+                "idle": pool.checkedin(),
+                "overflow": max(pool.overflow(), 0),
+                "max_overflow": pool._max_overflow,
+                "timeout": pool.timeout(),
+            })
+        return stats
+
+
+class _InstrumentedPool:
+    """Mixed in ahead of a QueuePool class; `metrics` is set per engine."""
+
+    metrics: PoolMetrics
+
+    def _do_get(self):
+        started = time.perf_counter()
+        overflow_before = self.overflow()
+        try:
+            connection = super()._do_get()
+        except exc.TimeoutError:
+            self.metrics.record_timeout()
+            self.metrics.record_wait((time.perf_counter() - started) * 1000, False)
+            raise
+        # Only a checkout that opened a connection beyond pool_size counts;
+        # reusing an idle one while overflowed doesn't
+        overflow_after = self.overflow()
+        opened_overflow = overflow_after > overflow_before and overflow_after > 0
+        self.metrics.record_wait((time.perf_counter() - started) * 1000, opened_overflow)
+        return connection
+
+    def connect(self):
+        # Includes the wait above plus pre-ping and checkout handlers
+        started = time.perf_counter()
+        connection = super().connect()
+        self.metrics.record_checkout((time.perf_counter() - started) * 1000, self.checkedout())
+        return connection
+
+
+def instrumented_pool_class(name: str, base: Type[Pool]) -> Type[Pool]:
+    """A `base` subclass reporting to the PoolMetrics called `name`.
+
+    The metrics live on the class so they survive engine.dispose(), which
+    recreates the pool from its class.
+    """
+    metrics = _registry.get(name) or PoolMetrics(name)
+    metrics.pool_class = base.__name__
+    return type(f"Instrumented{base.__name__}", (_InstrumentedPool, base), {"metrics": metrics})
+
+
+def instrument_engine(engine, metrics: PoolMetrics) -> None:
+    """Time connection hold periods and count new DBAPI connections."""
+    metrics.pool = engine.pool
+
+    @event.listens_for(engine, "connect")
+    def _on_connect(dbapi_connection, connection_record):
+        metrics.record_connect()
+
+    @event.listens_for(engine, "checkout")
+    def _on_checkout(dbapi_connection, connection_record, connection_proxy):
+        connection_record.info["checked_out_at"] = time.perf_counter()
+
+    @event.listens_for(engine, "checkin")
+    def _on_checkin(dbapi_connection, connection_record):
+        checked_out_at = connection_record.info.pop("checked_out_at", None)
+        if checked_out_at is not None:
+            metrics.record_hold((time.perf_counter() - checked_out_at) * 1000)
+
+    @event.listens_for(engine, "engine_disposed")
+    def _on_dispose(engine_):
+        metrics.pool = engine_.pool
+
+
+def pool_metrics() -> Dict[str, dict]:
+    """Stats for every instrumented pool, keyed by engine name."""
+    return {name: metrics.stats() for name, metrics in _registry.items()}
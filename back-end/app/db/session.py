@@ -4,32 +4,127 @@ from dotenv import load_dotenv
 
 load_dotenv()
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+from app.db.pool_metrics import instrument_engine, instrumented_pool_class
 
 DATABASE_URL = os.getenv("SQLALCHEMY_DATABASE_URL") 
 if not DATABASE_URL:
     raise RuntimeError("No DATABASE_URL provided")
 
-if DATABASE_URL.startswith("sqlite"):
+# Pool sizing, per engine and per worker process. The sync and async engines
+# each keep DB_POOL_SIZE + DB_MAX_OVERFLOW connections at most, so a server
+# with N workers can open up to 2 * N * (size + overflow) connections.
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+# Replace connections older than this (seconds) before the server or a proxy drops them
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+# Server-side prepared statements. psycopg 3 prepares a query after it has
+# run DB_PREPARE_THRESHOLD times, and asyncpg caches DB_STATEMENT_CACHE_SIZE
+# statements per connection. Set "none" / 0 behind a transaction-mode
+# pgbouncer. Unset keeps the driver default.
+DB_PREPARE_THRESHOLD = os.getenv("DB_PREPARE_THRESHOLD")
+DB_STATEMENT_CACHE_SIZE = os.getenv("DB_STATEMENT_CACHE_SIZE")
+
+
+def _pool_options(url, name: str, base) -> dict:
+    if url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:"):
+        # In-memory SQLite is tied to a single connection; keep SQLAlchemy's pool
+        return {}
+    return {
+        "poolclass": instrumented_pool_class(name, base),
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+    }
+
+
+def _instrument(engine) -> None:
+    metrics = getattr(engine.pool, "metrics", None)
+    if metrics is not None:
+        instrument_engine(engine, metrics)
+
+
+_sync_url = make_url(DATABASE_URL)
+
+if _sync_url.get_backend_name() == "sqlite":
     engine = create_engine(
         DATABASE_URL,
-        connect_args={"check_same_thread": False}
+        connect_args={"check_same_thread": False},
+        **_pool_options(_sync_url, "sync", QueuePool)
     )
 else:
     # force SSL when talking to Postgres on Render/Railway/etc.
+    connect_args = {"sslmode": "require"}
+    if DB_PREPARE_THRESHOLD is not None and _sync_url.get_driver_name() == "psycopg":
+        threshold = DB_PREPARE_THRESHOLD.lower()
+        connect_args["prepare_threshold"] = None if threshold == "none" else int(threshold)
     engine = create_engine(
         DATABASE_URL,
-        pool_pre_ping=True,
-        connect_args={"sslmode": "require"}
+        pool_pre_ping=DB_POOL_PRE_PING,
+        connect_args=connect_args,
+        **_pool_options(_sync_url, "sync", QueuePool)
     )
+_instrument(engine)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
+
+# Async engine for code running on the event loop (async def endpoints).
+# Thread-pool code (sync endpoints, googleapiclient fetchers, background
+# jobs) keeps using SessionLocal above.
+def _async_database_url(url: str):
+    parsed = make_url(url)
+    if parsed.drivername.startswith("sqlite"):
+        return parsed.set(drivername="sqlite+aiosqlite")
+    if parsed.drivername.startswith("postgresql"):
+        # asyncpg takes ssl as a connect arg, not libpq's sslmode
+        query = {k: v for k, v in parsed.query.items() if k != "sslmode"}
+        return parsed.set(drivername="postgresql+asyncpg", query=query)
+    return parsed
+
+
+ASYNC_DATABASE_URL = _async_database_url(DATABASE_URL)
+
+if ASYNC_DATABASE_URL.drivername.startswith("sqlite"):
+    async_engine = create_async_engine(
+        ASYNC_DATABASE_URL,
+        **_pool_options(ASYNC_DATABASE_URL, "async", AsyncAdaptedQueuePool)
+    )
+else:
+    if DB_STATEMENT_CACHE_SIZE is not None:
+        ASYNC_DATABASE_URL = ASYNC_DATABASE_URL.update_query_dict(
+            {"prepared_statement_cache_size": DB_STATEMENT_CACHE_SIZE}
+        )
+    async_engine = create_async_engine(
+        ASYNC_DATABASE_URL,
+        pool_pre_ping=DB_POOL_PRE_PING,
+        connect_args={"ssl": "require"},
+        **_pool_options(ASYNC_DATABASE_URL, "async", AsyncAdaptedQueuePool)
+    )
+_instrument(async_engine.sync_engine)
+
+# expire_on_commit=False so attributes stay readable after commit without
+# an implicit (and, under asyncio, disallowed) lazy reload
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
         db.close()
+
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
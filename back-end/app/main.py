@@ -4,6 +4,10 @@ from app.api.v1.endpoints import youtube
 
 from app.api.v1.endpoints.instagram import router as instagram_router
 from app.api.v1.endpoints.user import router as user_router
+from app.api.v1.endpoints.ops import router as ops_router
+from app.core.http import close_http_clients
+from app.services.dashboard_prefetch import DASHBOARD_PREFETCH_ENABLED, dashboard_prefetcher
+from app.services.token_refresh import TOKEN_REFRESH_ENABLED, token_refresh_scheduler
 from fastapi.middleware.cors import CORSMiddleware
 app = FastAPI()
 
@@ -21,6 +25,25 @@ app.add_middleware(
 app.include_router(youtube.router, prefix="/youtube", tags=["Youtube"])
 
 
+@app.on_event("startup")
+async def start_token_refresh():
+    if TOKEN_REFRESH_ENABLED:
+        token_refresh_scheduler.start()
+
+
+@app.on_event("startup")
+async def start_dashboard_prefetch():
+    if DASHBOARD_PREFETCH_ENABLED:
+        dashboard_prefetcher.start()
+
+
+@app.on_event("shutdown")
+async def shutdown_http_clients():
+    token_refresh_scheduler.stop()
+    await dashboard_prefetcher.stop()
+    await close_http_clients()
+
+
 
 app.include_router(
     instagram_router,
@@ -32,4 +55,10 @@ app.include_router(
     user_router,
     prefix="/user",
     tags=["User"]
-)
\ No newline at end of file
+)
+
+app.include_router(
+    ops_router,
+    prefix="/ops",
+    tags=["Ops"]
+)
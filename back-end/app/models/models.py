@@ -1,8 +1,10 @@
-from sqlalchemy import Boolean, Column, DateTime, String, Integer
+from sqlalchemy import Boolean, Column, Date, DateTime, Float, LargeBinary, String, Integer
 from sqlalchemy.orm import relationship
-from sqlalchemy import ForeignKey
+from sqlalchemy import ForeignKey, Index
 from app.db.session import Base, get_db  # Importing Base and get_db from your session.py
-from sqlalchemy.orm import Session
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.services.auth_cache import invalidate_user
 
 from sqlalchemy import create_engine, Column, String, Integer
 from sqlalchemy.ext.declarative import declarative_base
@@ -36,29 +38,144 @@ class User(Base):
     access_token = Column(String, nullable=True)  # Optional, if using OAuth
 
 
-def store_access_token(db: Session,email:str, access_token: str):
+class YouTubeChannel(Base):
+    __tablename__ = 'yt_channels'
+
+    id = Column(String, primary_key=True)  # YouTube channel id
+    user_id = Column(Integer, ForeignKey('users.id'), index=True, nullable=False)
+    uploads_playlist_id = Column(String, nullable=False)
+    videos_synced_at = Column(DateTime, nullable=True)  # last uploads-playlist sync
+
+
+class YouTubeVideo(Base):
+    __tablename__ = 'yt_videos'
+    __table_args__ = (
+        Index('ix_yt_videos_channel_published', 'channel_id', 'published_at'),
+    )
+
+    id = Column(String, primary_key=True)  # YouTube video id
+    channel_id = Column(String, ForeignKey('yt_channels.id'), nullable=False)
+    published_at = Column(DateTime, nullable=True)
+
+
+class YouTubeDailyMetric(Base):
+    # One row per channel per day, mirroring schemas.YouTubeDailyMetrics
+    __tablename__ = 'yt_daily_metrics'
+
+    channel_id = Column(String, ForeignKey('yt_channels.id'), primary_key=True)
+    d_date = Column(Date, primary_key=True)
+    views = Column(Integer, nullable=False, default=0)
+    estimated_minutes_watched = Column(Integer, nullable=False, default=0)
+    average_view_duration = Column(Float, nullable=False, default=0)
+    average_view_percentage = Column(Float, nullable=False, default=0)
+    subscribers_gained = Column(Integer, nullable=False, default=0)
+    subscribers_lost = Column(Integer, nullable=False, default=0)
+    likes = Column(Integer, nullable=False, default=0)
+    dislikes = Column(Integer, nullable=False, default=0)
+    shares = Column(Integer, nullable=False, default=0)
+    comments = Column(Integer, nullable=False, default=0)
+    fetched_at = Column(DateTime, nullable=False)  # when this day was last pulled upstream
+
+
+class InstagramAccount(Base):
+    __tablename__ = 'ig_accounts'
+
+    id = Column(String, primary_key=True)  # Instagram business account id
+    user_id = Column(Integer, ForeignKey('users.id'), index=True, nullable=False)
+    media_synced_at = Column(DateTime, nullable=True)  # last /media sync
+
+
+class InstagramMedia(Base):
+    __tablename__ = 'ig_media'
+    __table_args__ = (
+        Index('ix_ig_media_account_timestamp', 'account_id', 'timestamp'),
+    )
+
+    id = Column(String, primary_key=True)  # Instagram media id
+    account_id = Column(String, ForeignKey('ig_accounts.id'), nullable=False)
+    caption = Column(String, nullable=True)
+    timestamp = Column(DateTime, nullable=False)  # UTC
+    media_type = Column(String, nullable=False, default="IMAGE")
+    media_url = Column(String, nullable=True)
+    permalink = Column(String, nullable=True)
+    like_count = Column(Integer, nullable=False, default=0)
+    comments_count = Column(Integer, nullable=False, default=0)
+    saves_count = Column(Integer, nullable=False, default=0)
+    shares_count = Column(Integer, nullable=False, default=0)
+    reach = Column(Integer, nullable=True)
+    impressions = Column(Integer, nullable=True)
+    insights_fetched_at = Column(DateTime, nullable=True)
+
+
+class InstagramDailyInsight(Base):
+    # One row per account per day of the dashboard's UserInsights fields.
+    # The total-value metrics are only known for the day they were snapshotted,
+    # so they stay NULL for days only seen in the follower_count/reach series.
+    __tablename__ = 'ig_daily_insights'
+
+    account_id = Column(String, ForeignKey('ig_accounts.id'), primary_key=True)
+    d_date = Column(Date, primary_key=True)
+    follower_count = Column(Integer, nullable=True)
+    reach = Column(Integer, nullable=True)
+    views = Column(Integer, nullable=True)
+    accounts_engaged = Column(Integer, nullable=True)
+    comments = Column(Integer, nullable=True)
+    likes = Column(Integer, nullable=True)
+    saves = Column(Integer, nullable=True)
+    shares = Column(Integer, nullable=True)
+    total_interactions = Column(Integer, nullable=True)
+    fetched_at = Column(DateTime, nullable=False)
+
+
+class DashboardSnapshot(Base):
+    # Precomputed dashboard responses. Each build adds a new version for its
+    # (user, provider, params_key); older versions are pruned.
+    __tablename__ = 'dashboard_snapshots'
+    __table_args__ = (
+        Index('ix_dashboard_snapshots_lookup', 'user_id', 'provider', 'params_key', 'version', unique=True),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
+    provider = Column(String, nullable=False)  # "youtube" | "instagram"
+    params_key = Column(String, nullable=False)  # e.g. the date range for YouTube
+    version = Column(Integer, nullable=False)
+    payload = Column(LargeBinary, nullable=False)  # serialized JSON response body
+    created_at = Column(DateTime, nullable=False)
+
+
+async def store_access_token(db: AsyncSession,email:str, access_token: str):
     try:
         # Check if the data already exists
-        user = db.query(User).filter_by(email = email).first()
+        user = (await db.execute(select(User).filter_by(email = email))).scalars().first()
         
       
             # Create new record
+        if user.access_token != access_token:
+            # A new token may belong to a different account; resolve it again
+            user.instagram_user_id = None
+            user.facebook_page_id = None
         user.access_token = access_token
         user.ig_is_connected = True
-        db.commit()
+        # Snapshots may belong to the previous account
+        await db.execute(delete(DashboardSnapshot).where(
+            DashboardSnapshot.user_id == user.id, DashboardSnapshot.provider == "instagram"
+        ))
+        await db.commit()
+        invalidate_user(user.id)
         print(f"Acess token stored successfully.")
 
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         print(f"Error storing data: {e}")
 
 
 
 
-def store_instagram_data(db: Session,email:str,facebook_page_id: str,  instagram_user_id: str):
+async def store_instagram_data(db: AsyncSession,email:str,facebook_page_id: str,  instagram_user_id: str):
     try:
         # Check if the data already exists
-        existing_data = db.query(User).filter_by(email= email).first()
+        existing_data = (await db.execute(select(User).filter_by(email= email))).scalars().first()
         
         if existing_data:
 
@@ -76,10 +193,10 @@ def store_instagram_data(db: Session,email:str,facebook_page_id: str,  instagram
         # )
         # db.add(new_data)
     
-        db.commit()
+        await db.commit()
         print(f"Data for user {facebook_page_id} stored successfully.")
 
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         print(f"Error storing data: {e}")
 
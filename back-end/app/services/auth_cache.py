@@ -0,0 +1,54 @@
+# app/services/auth_cache.py
+#
+# Caches for the authenticated request path. Verified JWT claims are kept
+# until the token's own exp, so a repeat token skips signature verification,
+# and the small user projection returned by get_current_user is kept per
+# user id so /user/me and friends skip the DB.
+#
+# Anything that changes a field of the projection (connecting or
+# disconnecting YouTube/Instagram) must call invalidate_user. Other workers
+# pick the change up after USER_CACHE_TTL at the latest.
+
+import hashlib
+import os
+import time
+from typing import Optional
+
+from app.core.cache import TTLCache
+
+JWT_CLAIMS_CACHE_SIZE = int(os.getenv("JWT_CLAIMS_CACHE_SIZE", "4096"))
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "2048"))
+USER_CACHE_TTL = int(os.getenv("USER_CACHE_TTL", "60"))
+
+_claims_cache = TTLCache("jwt_claims", JWT_CLAIMS_CACHE_SIZE)
+_user_cache = TTLCache("user_projection", USER_CACHE_SIZE)
+
+
+def _token_key(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def cached_claims(token: str) -> Optional[dict]:
+    return _claims_cache.get(_token_key(token))
+
+
+def store_claims(token: str, claims: dict) -> None:
+    """Cache verified claims until the token expires (tokens without exp aren't cached)."""
+    exp = claims.get("exp")
+    if exp is None:
+        return
+    ttl = exp - time.time()
+    if ttl > 0:
+        _claims_cache.set(_token_key(token), claims, ttl)
+
+
+def cached_user(user_id: int) -> Optional[dict]:
+    return _user_cache.get(user_id)
+
+
+def store_user(user_id: int, projection: dict) -> None:
+    _user_cache.set(user_id, projection, USER_CACHE_TTL)
+
+
+def invalidate_user(user_id: int) -> None:
+    _user_cache.invalidate(user_id)
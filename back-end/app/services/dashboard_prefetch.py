@@ -0,0 +1,141 @@
+# app/services/dashboard_prefetch.py
+#
+# Precomputes dashboards into versioned snapshots so the endpoints can serve
+# them without waiting on upstream APIs. Every DASHBOARD_PREFETCH_INTERVAL
+# seconds each user with YouTube and/or Instagram connected gets their
+# default dashboard rebuilt with the regular fetchers. Job starts are spread
+# over DASHBOARD_PREFETCH_JITTER seconds and at most
+# DASHBOARD_PREFETCH_CONCURRENCY builds run at once. Users whose snapshot is
+# younger than half an interval (e.g. a live request just stored one) are
+# skipped.
+#
+# Runs on the app's event loop when DASHBOARD_PREFETCH_ENABLED=true. With
+# several workers, prefer one standalone process instead:
+#     python -m app.services.dashboard_prefetch
+
+import asyncio
+import os
+import random
+from typing import List, Optional, Tuple
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import or_, select
+
+from app.core.http import close_http_clients
+from app.db.session import SessionLocal
+from app.models.models import User
+from app.services.dashboard_snapshots import INSTAGRAM_PARAMS_KEY, latest_snapshot, youtube_params_key
+from app.services.instagram_dashboard import rebuild_instagram_snapshot
+from app.services.yt_analytics_v2 import rebuild_youtube_snapshot, resolve_date_range
+
+DASHBOARD_PREFETCH_ENABLED = os.getenv("DASHBOARD_PREFETCH_ENABLED", "false").lower() == "true"
+DASHBOARD_PREFETCH_INTERVAL = int(os.getenv("DASHBOARD_PREFETCH_INTERVAL", "900"))
+DASHBOARD_PREFETCH_JITTER = float(os.getenv("DASHBOARD_PREFETCH_JITTER", "60"))
+DASHBOARD_PREFETCH_CONCURRENCY = int(os.getenv("DASHBOARD_PREFETCH_CONCURRENCY", "4"))
+
+
+def _connected_users() -> List[Tuple[str, bool, bool]]:
+    db = SessionLocal()
+    try:
+        rows = db.execute(
+            select(User.email, User.yt_is_connected, User.ig_is_connected)
+            .where(or_(User.yt_is_connected == True, User.ig_is_connected == True))  # noqa: E712
+        ).all()
+        return [(email, bool(yt), bool(ig)) for email, yt, ig in rows]
+    finally:
+        db.close()
+
+
+def _youtube_params_key() -> str:
+    # Same default range /yt-metrics uses when no dates are given
+    return youtube_params_key(*resolve_date_range("daily", None, None))
+
+
+async def prefetch_youtube(email: str) -> None:
+    await run_in_threadpool(rebuild_youtube_snapshot, email, *resolve_date_range("daily", None, None))
+
+
+async def prefetch_instagram(email: str) -> None:
+    await rebuild_instagram_snapshot(email)
+
+
+PREFETCHERS = {
+    "youtube": (prefetch_youtube, _youtube_params_key),
+    "instagram": (prefetch_instagram, lambda: INSTAGRAM_PARAMS_KEY),
+}
+
+
+async def run_once(jitter: float = DASHBOARD_PREFETCH_JITTER) -> dict:
+    """One pass over every connected user; returns the number of snapshots built per provider."""
+    users = await run_in_threadpool(_connected_users)
+    semaphore = asyncio.Semaphore(DASHBOARD_PREFETCH_CONCURRENCY)
+    built = {provider: 0 for provider in PREFETCHERS}
+
+    async def job(provider: str, email: str) -> None:
+        await asyncio.sleep(random.uniform(0, jitter))
+        prefetch, params_key = PREFETCHERS[provider]
+        async with semaphore:
+            fresh = await run_in_threadpool(
+                latest_snapshot, email, provider, params_key(), DASHBOARD_PREFETCH_INTERVAL // 2
+            )
+            if fresh is not None:
+                return
+            try:
+                await prefetch(email)
+                built[provider] += 1
+            except Exception as e:
+                print(f"Dashboard prefetch ({provider}) failed for {email}: {e}")
+
+    jobs = []
+    for email, yt_connected, ig_connected in users:
+        if yt_connected:
+            jobs.append(job("youtube", email))
+        if ig_connected:
+            jobs.append(job("instagram", email))
+    await asyncio.gather(*jobs)
+    return built
+
+
+class DashboardPrefetcher:
+    """Background task running run_once every `interval` seconds on the current loop."""
+
+    def __init__(self, interval: int = DASHBOARD_PREFETCH_INTERVAL):
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self.run_forever())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def run_forever(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            try:
+                await run_once(min(DASHBOARD_PREFETCH_JITTER, self.interval))
+            except Exception as e:
+                print(f"Dashboard prefetch pass failed: {e}")
+            await asyncio.sleep(max(self.interval - (loop.time() - started), 0))
+
+
+dashboard_prefetcher = DashboardPrefetcher()
+
+
+async def _main() -> None:
+    try:
+        await DashboardPrefetcher().run_forever()
+    finally:
+        await close_http_clients()
+
+
+if __name__ == "__main__":
+    asyncio.run(_main())
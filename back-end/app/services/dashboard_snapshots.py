@@ -0,0 +1,203 @@
+# app/services/dashboard_snapshots.py
+#
+# Versioned, materialized dashboard responses. Every live build and every
+# prefetch run (app/services/dashboard_prefetch.py) stores its serialized
+# body as a new version; endpoints serve the latest version straight from
+# the stored bytes.
+#
+# Serving is stale-while-revalidate with a soft and a hard TTL per provider
+# (DASHBOARD_<PROVIDER>_SOFT_TTL / _HARD_TTL). A snapshot younger than the
+# soft TTL is served as is; between the two it is still served, with its
+# Age, and a rebuild is scheduled to run after the response; past the hard
+# TTL the endpoint builds live.
+
+import asyncio
+import json
+import os
+import threading
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Optional, Sequence, Tuple
+
+from fastapi import BackgroundTasks, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import delete, func, select
+from sqlalchemy.exc import IntegrityError
+from starlette.responses import Response
+
+from app.db.session import SessionLocal
+from app.models.models import DashboardSnapshot, User
+
+DASHBOARD_SNAPSHOT_MAX_AGE = int(os.getenv("DASHBOARD_SNAPSHOT_MAX_AGE", "1800"))
+# Versions kept per (user, provider, params_key)
+DASHBOARD_SNAPSHOT_KEEP = int(os.getenv("DASHBOARD_SNAPSHOT_KEEP", "3"))
+
+
+def _snapshot_ttls(provider: str, hard: int) -> Tuple[int, int]:
+    prefix = f"DASHBOARD_{provider.upper()}"
+    return (
+        int(os.getenv(f"{prefix}_SOFT_TTL", DASHBOARD_SNAPSHOT_MAX_AGE)),
+        int(os.getenv(f"{prefix}_HARD_TTL", hard)),
+    )
+
+
+# YouTube Analytics data lags by days; Instagram insights move faster
+SNAPSHOT_TTLS: Dict[str, Tuple[int, int]] = {
+    "youtube": _snapshot_ttls("youtube", 24 * 3600),
+    "instagram": _snapshot_ttls("instagram", 6 * 3600),
+}
+
+
+def youtube_params_key(start_date: str, end_date: str) -> str:
+    return f"{start_date}:{end_date}"
+
+
+INSTAGRAM_PARAMS_KEY = "default"
+
+
+def parse_sections(value: Optional[str], available: Sequence[str]) -> Optional[Tuple[str, ...]]:
+    """Comma-separated `sections=` value as a tuple in `available` order; None means all.
+
+    Snapshots always hold every section; a partial request is served by
+    slicing one (snapshot_sections) or by a partial build that isn't stored.
+    """
+    if not value:
+        return None
+    requested = {section.strip() for section in value.split(",") if section.strip()}
+    unknown = requested.difference(available)
+    if unknown:
+        raise HTTPException(400, f"Unknown sections: {', '.join(sorted(unknown))}")
+    if requested.issuperset(available):
+        return None
+    return tuple(section for section in available if section in requested)
+
+
+def _latest_query(email: str, provider: str, params_key: str, max_age: Optional[int]):
+    query = (
+        select(DashboardSnapshot)
+        .join(User, User.id == DashboardSnapshot.user_id)
+        .where(
+            User.email == email,
+            DashboardSnapshot.provider == provider,
+            DashboardSnapshot.params_key == params_key,
+        )
+        .order_by(DashboardSnapshot.version.desc())
+        .limit(1)
+    )
+    if max_age is not None:
+        query = query.where(DashboardSnapshot.created_at >= datetime.utcnow() - timedelta(seconds=max_age))
+    return query
+
+
+def latest_snapshot(
+    email: str, provider: str, params_key: str, max_age: Optional[int] = DASHBOARD_SNAPSHOT_MAX_AGE
+) -> Optional[DashboardSnapshot]:
+    """Newest snapshot no older than max_age seconds (any age if None)."""
+    db = SessionLocal()
+    try:
+        snapshot = db.execute(_latest_query(email, provider, params_key, max_age)).scalars().first()
+        if snapshot is not None:
+            db.expunge(snapshot)
+        return snapshot
+    finally:
+        db.close()
+
+
+async def latest_snapshot_async(
+    db, email: str, provider: str, params_key: str, max_age: Optional[int] = DASHBOARD_SNAPSHOT_MAX_AGE
+) -> Optional[DashboardSnapshot]:
+    return (await db.execute(_latest_query(email, provider, params_key, max_age))).scalars().first()
+
+
+def save_snapshot(email: str, provider: str, params_key: str, payload: bytes) -> Optional[int]:
+    """Store `payload` as the next version and prune old ones; returns the version."""
+    db = SessionLocal()
+    try:
+        user_id = db.execute(select(User.id).where(User.email == email)).scalar()
+        if user_id is None:
+            return None
+        scope = (
+            DashboardSnapshot.user_id == user_id,
+            DashboardSnapshot.provider == provider,
+            DashboardSnapshot.params_key == params_key,
+        )
+        version = (db.execute(select(func.max(DashboardSnapshot.version)).where(*scope)).scalar() or 0) + 1
+        db.add(DashboardSnapshot(
+            user_id=user_id,
+            provider=provider,
+            params_key=params_key,
+            version=version,
+            payload=payload,
+            created_at=datetime.utcnow(),
+        ))
+        db.execute(delete(DashboardSnapshot).where(*scope, DashboardSnapshot.version <= version - DASHBOARD_SNAPSHOT_KEEP))
+        try:
+            db.commit()
+        except IntegrityError:
+            # A concurrent build took this version number; its snapshot is as fresh
+            db.rollback()
+            return None
+        return version
+    finally:
+        db.close()
+
+
+def clear_snapshots(user_id: int, provider: str):
+    """Delete statement for a user's snapshots of one provider (on connect/disconnect)."""
+    return delete(DashboardSnapshot).where(
+        DashboardSnapshot.user_id == user_id, DashboardSnapshot.provider == provider
+    )
+
+
+def snapshot_age(snapshot: DashboardSnapshot) -> float:
+    return max((datetime.utcnow() - snapshot.created_at).total_seconds(), 0.0)
+
+
+def is_stale(snapshot: DashboardSnapshot) -> bool:
+    """Past its provider's soft TTL (callers only load snapshots within the hard TTL)."""
+    return snapshot_age(snapshot) >= SNAPSHOT_TTLS[snapshot.provider][0]
+
+
+_revalidating: set = set()
+_revalidating_lock = threading.Lock()
+
+
+def schedule_revalidation(
+    background_tasks: BackgroundTasks, email: str, provider: str, params_key: str, rebuild: Callable, *args
+) -> bool:
+    """Run rebuild(*args) (sync or async) after the response, once per snapshot key at a time."""
+    key = (email, provider, params_key)
+    with _revalidating_lock:
+        if key in _revalidating:
+            return False
+        _revalidating.add(key)
+
+    async def run() -> None:
+        try:
+            if asyncio.iscoroutinefunction(rebuild):
+                await rebuild(*args)
+            else:
+                await run_in_threadpool(rebuild, *args)
+        except Exception as e:
+            print(f"Dashboard revalidation ({provider}) failed for {email}: {e}")
+        finally:
+            with _revalidating_lock:
+                _revalidating.discard(key)
+
+    background_tasks.add_task(run)
+    return True
+
+
+def snapshot_sections(snapshot: DashboardSnapshot, sections: Sequence[str]) -> dict:
+    data = json.loads(snapshot.payload)
+    return {section: data[section] for section in sections if section in data}
+
+
+def snapshot_headers(snapshot: DashboardSnapshot) -> dict:
+    return {
+        "X-Snapshot-Version": str(snapshot.version),
+        "Age": str(int(snapshot_age(snapshot))),
+    }
+
+
+def snapshot_response(snapshot: DashboardSnapshot) -> Response:
+    return Response(content=snapshot.payload, media_type="application/json", headers=snapshot_headers(snapshot))
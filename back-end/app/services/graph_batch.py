@@ -0,0 +1,87 @@
+# app/services/graph_batch.py
+#
+# Request planning for the Graph API. Insights metrics that share a
+# (period, metric_type) can be asked for in one /insights call, and the
+# remaining calls can be sent together as a single batch POST
+# (https://developers.facebook.com/docs/graph-api/batch-requests).
+
+import json
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+from urllib.parse import urlencode
+
+# Graph API caps a batch at 50 requests
+MAX_BATCH_SIZE = 50
+
+
+class InsightsCall(NamedTuple):
+    period: str
+    metric_type: Optional[str]
+    metrics: Tuple[str, ...]
+
+
+def plan_insights(requests: Iterable[Tuple[str, str, Optional[str]]]) -> List[InsightsCall]:
+    """Merge (metrics, period, metric_type) requests into one call per (period, metric_type).
+
+    `metrics` is a comma-separated list; duplicates across requests are asked
+    for once. Groups and metrics keep their first-seen order.
+    """
+    groups: Dict[Tuple[str, Optional[str]], List[str]] = {}
+    for metrics, period, metric_type in requests:
+        group = groups.setdefault((period, metric_type), [])
+        for metric in metrics.split(","):
+            if metric not in group:
+                group.append(metric)
+    return [
+        InsightsCall(period, metric_type, tuple(metrics))
+        for (period, metric_type), metrics in groups.items()
+    ]
+
+
+def insights_relative_url(object_id: str, call: InsightsCall) -> str:
+    params = {"metric": ",".join(call.metrics), "period": call.period}
+    if call.metric_type:
+        params["metric_type"] = call.metric_type
+    return relative_url(f"{object_id}/insights", params)
+
+
+def relative_url(path: str, params: dict) -> str:
+    return f"{path}?{urlencode(params)}" if params else path
+
+
+def select_metrics(response: dict, metrics: str) -> dict:
+    """Narrow a merged insights response to `metrics`, in the order asked for.
+
+    Error responses are passed through untouched so callers see the same
+    payload they would have got from a dedicated call.
+    """
+    if "data" not in response:
+        return response
+    by_name = {item.get("name"): item for item in response["data"]}
+    return {"data": [by_name[name] for name in metrics.split(",") if name in by_name]}
+
+
+def batch_payload(access_token: str, relative_urls: List[str]) -> dict:
+    if len(relative_urls) > MAX_BATCH_SIZE:
+        raise ValueError(f"Graph batch is limited to {MAX_BATCH_SIZE} requests")
+    return {
+        "access_token": access_token,
+        "include_headers": "false",
+        "batch": json.dumps([{"method": "GET", "relative_url": url} for url in relative_urls]),
+    }
+
+
+def parse_batch_response(payload, expected: int) -> List[dict]:
+    """Decode each batch item's body; failed or timed-out items become Graph-style errors."""
+    if not isinstance(payload, list):
+        # The whole batch was rejected (bad token etc.); every item gets the error
+        return [payload] * expected
+    results = []
+    for item in payload:
+        if item is None:
+            results.append({"error": {"message": "Batch request timed out"}})
+            continue
+        try:
+            results.append(json.loads(item.get("body") or "{}"))
+        except ValueError:
+            results.append({"error": {"message": f"Invalid batch body (HTTP {item.get('code')})"}})
+    return results
@@ -0,0 +1,300 @@
+# app/services/ig_media.py
+#
+# Persisted Instagram media. /{ig_user_id}/media is walked page by page
+# (following paging.cursors) newest first, and the walk stops at the first
+# stored post older than IG_MEDIA_REFRESH_DAYS, since counts on older posts
+# have settled. Insights are only refetched for posts inside that window,
+# plus once for any post that has never had them, and are sent as Graph
+# batches of up to 50 media. A sync with `inline_insights` only refreshes
+# the newest posts (the ones the dashboard shows) itself and leaves the
+# rest to a background backfill, so a first sync of a large account
+# doesn't make the dashboard request wait on one insights call per post.
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterator, List, Optional, Set
+
+from sqlalchemy.exc import IntegrityError
+
+from app.core.http import get_session
+from app.db.session import SessionLocal
+from app.models.models import InstagramAccount, InstagramMedia, User
+from app.services.graph_batch import MAX_BATCH_SIZE, batch_payload, parse_batch_response, relative_url
+
+# Same Graph version as the dashboard endpoint
+GRAPH_URL = "https://graph.facebook.com/v22.0"
+
+# Skip the upstream check entirely if the media was synced this recently.
+IG_MEDIA_SYNC_INTERVAL = int(os.getenv("IG_MEDIA_SYNC_INTERVAL", "300"))
+# Posts younger than this still get their counts and insights refreshed.
+IG_MEDIA_REFRESH_DAYS = int(os.getenv("IG_MEDIA_REFRESH_DAYS", "30"))
+IG_MEDIA_PAGE_SIZE = int(os.getenv("IG_MEDIA_PAGE_SIZE", "100"))
+
+MEDIA_FIELDS = "id,caption,timestamp,media_type,like_count,comments_count,media_url,permalink"
+MEDIA_INSIGHTS = "views,reach,saved,shares,impressions"
+# Insight metric -> InstagramMedia column
+INSIGHT_COLUMNS = {
+    "reach": "reach",
+    "impressions": "impressions",
+    "saved": "saves_count",
+    "shares": "shares_count",
+}
+
+_account_locks: Dict[str, threading.Lock] = {}
+_account_locks_lock = threading.Lock()
+
+# One backfill at a time per worker, and one queued per account
+_backfill_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ig-insights-backfill")
+_backfilling: Set[str] = set()
+_backfilling_lock = threading.Lock()
+
+
+class GraphAPIError(Exception):
+    """A Graph call returned an error object instead of data."""
+
+    def __init__(self, error: dict):
+        super().__init__(error.get("message"))
+        self.error = error
+
+
+def _account_lock(account_id: str) -> threading.Lock:
+    with _account_locks_lock:
+        lock = _account_locks.get(account_id)
+        if lock is None:
+            lock = _account_locks[account_id] = threading.Lock()
+        return lock
+
+
+def _parse_timestamp(value: str) -> datetime:
+    # Graph timestamps look like 2024-05-01T12:00:00+0000
+    parsed = datetime.strptime(value, "%Y-%m-%dT%H:%M:%S%z")
+    return parsed.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def _format_timestamp(value: datetime) -> str:
+    return value.strftime("%Y-%m-%dT%H:%M:%S+0000")
+
+
+def iter_media(ig_user_id: str, token: str) -> Iterator[dict]:
+    """Yield every media item of an account, newest first, one page at a time."""
+    url = f"{GRAPH_URL}/{ig_user_id}/media"
+    params = {"fields": MEDIA_FIELDS, "limit": IG_MEDIA_PAGE_SIZE, "access_token": token}
+    while True:
+        resp = get_session().get(url, params=params).json()
+        if "error" in resp:
+            raise GraphAPIError(resp["error"])
+        yield from resp.get("data", [])
+
+        paging = resp.get("paging", {})
+        after = paging.get("cursors", {}).get("after")
+        if not after or not paging.get("next"):
+            return
+        params = {**params, "after": after}
+
+
+def resolve_account(db, email: str, ig_user_id: str) -> InstagramAccount:
+    account = db.get(InstagramAccount, ig_user_id)
+    user = db.query(User).filter_by(email=email).first()
+    if account is None:
+        account = InstagramAccount(id=ig_user_id, user_id=user.id)
+        db.add(account)
+        try:
+            db.commit()
+            return account
+        except IntegrityError:
+            # A concurrent task (e.g. the media sync and the insights store on
+            # a first streamed load) stored the same account first
+            db.rollback()
+            account = db.get(InstagramAccount, ig_user_id)
+            if account is None:
+                raise
+    if account.user_id != user.id:
+        # The business account was reconnected under another login
+        account.user_id = user.id
+        db.commit()
+    return account
+
+
+def _sync_media_rows(db, account: InstagramAccount, token: str, cutoff: datetime) -> None:
+    known = dict(
+        db.query(InstagramMedia.id, InstagramMedia.timestamp).filter_by(account_id=account.id)
+    )
+    seen = set()
+    for item in iter_media(account.id, token):
+        timestamp = _parse_timestamp(item["timestamp"])
+        if item["id"] in known and timestamp < cutoff:
+            break
+        seen.add(item["id"])
+
+        row = db.get(InstagramMedia, item["id"]) if item["id"] in known else None
+        if row is None:
+            row = InstagramMedia(id=item["id"], account_id=account.id)
+            db.add(row)
+        row.caption = item.get("caption")
+        row.timestamp = timestamp
+        row.media_type = item.get("media_type", "IMAGE")
+        row.media_url = item.get("media_url")
+        row.permalink = item.get("permalink")
+        row.like_count = item.get("like_count", 0)
+        row.comments_count = item.get("comments_count", 0)
+
+    # Every post inside the window was walked, so missing ones were deleted
+    deleted = [media_id for media_id, ts in known.items() if ts >= cutoff and media_id not in seen]
+    if deleted:
+        db.query(InstagramMedia).filter(InstagramMedia.id.in_(deleted)).delete(synchronize_session=False)
+    db.flush()
+
+
+def _insight_candidates(db, account_id: str, cutoff: datetime) -> List[InstagramMedia]:
+    """Posts due an insights refresh (young or never fetched), newest first."""
+    return (
+        db.query(InstagramMedia)
+        .filter(InstagramMedia.account_id == account_id)
+        .filter((InstagramMedia.timestamp >= cutoff) | InstagramMedia.insights_fetched_at.is_(None))
+        .order_by(InstagramMedia.timestamp.desc())
+        .all()
+    )
+
+
+def _is_permanent_error(error: dict) -> bool:
+    # Code 100 is an invalid parameter, e.g. a metric this media type (or a
+    # post from before the business conversion) doesn't support; retrying
+    # won't help. Rate limits, token and server errors are transient.
+    return error.get("code") == 100
+
+
+def _refresh_insights(db, token: str, rows: List[InstagramMedia]) -> bool:
+    """Fetch insights for `rows`; False if Graph rejected a whole batch (the rest is skipped)."""
+    for start in range(0, len(rows), MAX_BATCH_SIZE):
+        chunk = rows[start:start + MAX_BATCH_SIZE]
+        urls = [relative_url(f"{row.id}/insights", {"metric": MEDIA_INSIGHTS}) for row in chunk]
+        payload = get_session().post(f"{GRAPH_URL}/", data=batch_payload(token, urls)).json()
+        if not isinstance(payload, list):
+            # Bad token, rate limit etc.; nothing is marked so it's retried later
+            print(f"Instagram insights batch rejected: {payload.get('error', payload)}")
+            return False
+        fetched_at = datetime.utcnow()
+        for row, resp in zip(chunk, parse_batch_response(payload, len(chunk))):
+            if "data" not in resp:
+                # Media types that reject a metric keep their old values, but are
+                # marked fetched so settled posts aren't retried on every sync
+                if _is_permanent_error(resp.get("error", {})):
+                    row.insights_fetched_at = fetched_at
+                continue
+            for metric in resp["data"]:
+                column = INSIGHT_COLUMNS.get(metric.get("name"))
+                if column:
+                    setattr(row, column, metric.get("values", [{}])[0].get("value") or 0)
+            row.insights_fetched_at = fetched_at
+    return True
+
+
+def _backfill_insights(account_id: str, token: str, media_ids: List[str]) -> None:
+    db = SessionLocal()
+    try:
+        for start in range(0, len(media_ids), MAX_BATCH_SIZE):
+            # Locked per batch so dashboard syncs aren't held up for the whole run
+            with _account_lock(account_id):
+                rows = (
+                    db.query(InstagramMedia)
+                    .filter(InstagramMedia.id.in_(media_ids[start:start + MAX_BATCH_SIZE]))
+                    .all()
+                )
+                refreshed = _refresh_insights(db, token, rows)
+                db.commit()
+            if not refreshed:
+                return
+    except Exception as e:
+        db.rollback()
+        print(f"Instagram insights backfill failed for {account_id}: {e}")
+    finally:
+        db.close()
+        with _backfilling_lock:
+            _backfilling.discard(account_id)
+
+
+def _schedule_backfill(account_id: str, token: str, media_ids: List[str]) -> None:
+    with _backfilling_lock:
+        if account_id in _backfilling:
+            return
+        _backfilling.add(account_id)
+    _backfill_executor.submit(_backfill_insights, account_id, token, media_ids)
+
+
+def sync_media(
+    email: str, ig_user_id: str, token: str, force: bool = False, inline_insights: Optional[int] = None
+) -> None:
+    """Bring the stored media (and young posts' insights) up to date.
+
+    With `inline_insights`, only the newest that many posts get their
+    insights refreshed here; the other due posts are backfilled in the
+    background.
+    """
+    backfill: List[str] = []
+    db = SessionLocal()
+    try:
+        account = resolve_account(db, email, ig_user_id)
+
+        with _account_lock(account.id):
+            db.refresh(account)
+            fresh_until = (account.media_synced_at or datetime.min) + timedelta(seconds=IG_MEDIA_SYNC_INTERVAL)
+            if not force and datetime.utcnow() < fresh_until:
+                return
+            cutoff = datetime.utcnow() - timedelta(days=IG_MEDIA_REFRESH_DAYS)
+            _sync_media_rows(db, account, token, cutoff)
+            candidates = _insight_candidates(db, account.id, cutoff)
+            if inline_insights is not None:
+                newest = {
+                    media_id for (media_id,) in db.query(InstagramMedia.id)
+                    .filter_by(account_id=account.id)
+                    .order_by(InstagramMedia.timestamp.desc())
+                    .limit(inline_insights)
+                }
+                backfill = [row.id for row in candidates if row.id not in newest]
+                candidates = [row for row in candidates if row.id in newest]
+            _refresh_insights(db, token, candidates)
+            account.media_synced_at = datetime.utcnow()
+            try:
+                db.commit()
+            except IntegrityError:
+                # Another worker stored the same media first.
+                db.rollback()
+                backfill = []
+    finally:
+        db.close()
+    if backfill:
+        _schedule_backfill(ig_user_id, token, backfill)
+
+
+def read_recent_media(ig_user_id: str, limit: Optional[int] = None) -> List[dict]:
+    """Stored media, newest first, in the shape of the dashboard's MediaItem."""
+    db = SessionLocal()
+    try:
+        query = (
+            db.query(InstagramMedia)
+            .filter_by(account_id=ig_user_id)
+            .order_by(InstagramMedia.timestamp.desc())
+        )
+        if limit:
+            query = query.limit(limit)
+        return [
+            {
+                "id": row.id,
+                "caption": row.caption,
+                "timestamp": _format_timestamp(row.timestamp),
+                "like_count": row.like_count,
+                "comments_count": row.comments_count,
+                "saves_count": row.saves_count,
+                "shares_count": row.shares_count,
+                "reach": row.reach,
+                "impressions": row.impressions,
+                "media_url": row.media_url,
+                "permalink": row.permalink,
+                "media_type": row.media_type,
+            }
+            for row in query
+        ]
+    finally:
+        db.close()
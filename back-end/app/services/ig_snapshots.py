@@ -0,0 +1,93 @@
+# app/services/ig_snapshots.py
+#
+# Daily Instagram insight history. Graph only returns a short rolling window
+# for follower_count/reach, so each dashboard fetch upserts the days it saw
+# into ig_daily_insights, and long-range charts read them back as columnar
+# arrays with a single indexed (account_id, d_date) range scan.
+
+from datetime import date, datetime
+from typing import Dict, List
+
+from sqlalchemy.exc import IntegrityError
+
+from app.db.session import SessionLocal
+from app.models.models import InstagramDailyInsight
+from app.services.ig_media import resolve_account
+
+# Daily series from the time_series section
+SERIES_FIELDS = ["follower_count", "reach"]
+# Totals from the total_values section, only known for the snapshot day
+TOTAL_FIELDS = ["views", "accounts_engaged", "comments", "likes", "saves", "shares", "total_interactions"]
+INSIGHT_FIELDS = SERIES_FIELDS + TOTAL_FIELDS
+
+
+def _daily_rows(time_series: List[dict], total_values: List[dict]) -> Dict[date, dict]:
+    """Graph time_series/total_values payloads -> {day: {field: value}}."""
+    rows: Dict[date, dict] = {}
+    for metric in time_series:
+        if metric["name"] not in SERIES_FIELDS:
+            continue
+        for point in metric["values"]:
+            day = date.fromisoformat(point["end_time"][:10])
+            rows.setdefault(day, {})[metric["name"]] = point["value"]
+    if rows:
+        latest = rows[max(rows)]
+        for metric in total_values:
+            if metric["name"] in TOTAL_FIELDS:
+                latest[metric["name"]] = metric.get("total_value", {}).get("value", 0)
+    return rows
+
+
+def store_daily_insights(email: str, ig_user_id: str, time_series: List[dict], total_values: List[dict]) -> None:
+    rows = _daily_rows(time_series, total_values)
+    if not rows:
+        return
+    db = SessionLocal()
+    try:
+        account = resolve_account(db, email, ig_user_id)
+        existing = {
+            row.d_date: row
+            for row in db.query(InstagramDailyInsight)
+            .filter(InstagramDailyInsight.account_id == account.id)
+            .filter(InstagramDailyInsight.d_date.in_(list(rows)))
+        }
+        fetched_at = datetime.utcnow()
+        for day, values in rows.items():
+            row = existing.get(day)
+            if row is None:
+                row = InstagramDailyInsight(account_id=account.id, d_date=day)
+                db.add(row)
+            for field, value in values.items():
+                setattr(row, field, value)
+            row.fetched_at = fetched_at
+        try:
+            db.commit()
+        except IntegrityError:
+            # A concurrent dashboard request stored the same days first.
+            db.rollback()
+    finally:
+        db.close()
+
+
+def read_insights_range(ig_user_id: str, start: date, end: date) -> Dict[str, list]:
+    """Stored days in [start, end] as {"date": [...], field: [...]} columns."""
+    db = SessionLocal()
+    try:
+        columns = [InstagramDailyInsight.d_date] + [
+            getattr(InstagramDailyInsight, field) for field in INSIGHT_FIELDS
+        ]
+        rows = (
+            db.query(*columns)
+            .filter(InstagramDailyInsight.account_id == ig_user_id)
+            .filter(InstagramDailyInsight.d_date.between(start, end))
+            .order_by(InstagramDailyInsight.d_date)
+            .all()
+        )
+    finally:
+        db.close()
+
+    values = list(zip(*rows)) if rows else [()] * len(columns)
+    result = {"date": [day.isoformat() for day in values[0]]}
+    for field, column in zip(INSIGHT_FIELDS, values[1:]):
+        result[field] = list(column)
+    return result
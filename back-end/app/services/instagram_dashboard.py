@@ -0,0 +1,540 @@
+# app/services/instagram_dashboard.py
+#
+# Builds the Instagram dashboard from the Graph API: resolves the IG user id,
+# plans the profile/insights calls and the media sync for the requested
+# sections and turns the results into DashboardData. Used by the dashboard
+# endpoints and by the prefetch scheduler.
+
+import asyncio
+import os
+from collections import Counter
+from typing import Any, AsyncIterator, List, Optional, Set, Tuple
+
+from fastapi import HTTPException
+from fastapi.concurrency import run_in_threadpool
+from pydantic import BaseModel, Field
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.http import get_async_client
+from app.core.serialization import dump_model, validate
+from app.core.singleflight import AsyncSingleFlight
+from app.db.session import AsyncSessionLocal
+from app.models.models import store_instagram_data
+from app.services.dashboard_snapshots import INSTAGRAM_PARAMS_KEY, save_snapshot
+from app.services.graph_batch import (
+    batch_payload,
+    insights_relative_url,
+    parse_batch_response,
+    plan_insights,
+    relative_url,
+    select_metrics,
+)
+from app.services.ig_media import GraphAPIError, read_recent_media, sync_media
+from app.services.ig_snapshots import store_daily_insights
+from app.services.oauth_storage import get_instagram_account
+
+# --- Pydantic schemas for responses ---
+class UserInsights(BaseModel):
+    date: str = Field(..., description="ISO date of the metric")
+    follower_count: int
+    reach: int
+    views: int
+    accounts_engaged: int
+    comments: int
+    likes: int
+    saves: int
+    shares: int
+    total_interactions: int
+class MediaItem(BaseModel):
+    id: str
+    caption: Optional[str]
+    timestamp: str
+    like_count: int = Field(0, alias="like_count")
+    comments_count: int = Field(0, alias="comments_count")
+    saves_count: int = Field(0, alias="saves_count")
+    shares_count: int = Field(0, alias="shares_count")
+    reach: Optional[int]
+    impressions: Optional[int]
+    media_url: Optional[str]
+    permalink: Optional[str]
+    media_type: str = "IMAGE"
+
+class ProfileOverview(BaseModel):
+    username: str
+    profile_picture_url: str
+    followers_count: int
+    follows_count: int
+    bio: Optional[str]
+    link_in_bio: Optional[str]
+    media_count: int             # ← new field for number of posts
+    profile_views: Optional[int] # ← existing field for insights
+
+
+class AudienceInsights(BaseModel):
+    reach: Optional[int]
+    views: Optional[int]
+    online_followers: Optional[Any]
+    profile_views: Optional[int]
+    website_clicks: Optional[int]
+
+class DashboardData(BaseModel):
+    # Every section is optional so a sections= request can leave fields out
+    profile: Optional[ProfileOverview] = None
+    user_insights: Optional[List[UserInsights]] = None
+    recent_media: Optional[List[MediaItem]] = None
+    top_media: Optional[List[MediaItem]] = None  # Top media sorted by impressions
+    total_followers: Optional[int] = None
+    audience_insights: Optional[AudienceInsights] = None
+    engagement_rate: Optional[float] = Field(
+        None, description="Average engagement rate across recent posts"
+    )
+
+# --- Constants ---
+API_VERSION = 'v22.0'
+BASE_URL = 'https://graph.facebook.com'
+
+
+async def graph_get(url: str, params: dict) -> dict:
+    resp = await get_async_client().get(url, params=params)
+    return resp.json()
+
+# --- Helper to get Instagram User ID ---
+# The resolved ids are stored on the user, so this only runs when none are
+# stored (first connect, or a new token cleared them) or the stored id stops
+# resolving for the current token.
+class StaleInstagramAccount(Exception):
+    """The stored instagram_user_id is not a valid object for this token."""
+
+
+def _is_invalid_object(resp: dict) -> bool:
+    # Graph code 100 / subcode 33: object does not exist or is not accessible
+    error = resp.get("error") or {}
+    return error.get("code") == 100 and error.get("error_subcode") == 33
+
+
+def _raise_if_stale(resp: dict) -> None:
+    if _is_invalid_object(resp):
+        raise StaleInstagramAccount(resp["error"].get("message"))
+
+async def _get_ig_user_id(access_token: str, email: str) -> str:
+    resp = await graph_get(
+        f"{BASE_URL}/{API_VERSION}/me/accounts",
+        {"access_token": access_token}
+    )
+    if not resp.get("data"):
+        raise HTTPException(400, 'No Facebook pages found.')
+    page_id = resp["data"][0]["id"]
+    resp2 = await graph_get(
+        f"{BASE_URL}/{API_VERSION}/{page_id}",
+        {"fields": "instagram_business_account", "access_token": access_token}
+    )
+    ig = resp2.get("instagram_business_account")
+    if not ig:
+        raise HTTPException(400, 'No Instagram business account linked.')
+    await _store_ig_ids(email, page_id, ig['id'])
+    return ig['id']
+
+
+async def _store_ig_ids(email: str, page_id: str, ig_user_id: str) -> None:
+    async with AsyncSessionLocal() as db:
+        await store_instagram_data(db=db, email=email, facebook_page_id=page_id, instagram_user_id=ig_user_id)
+
+# --- Profile fetcher ---
+PROFILE_FIELDS = ",".join([
+    "username",
+    "profile_picture_url",
+    "followers_count",
+    "follows_count",
+    "biography",
+    "website",
+    "media_count"            # ← add media_count here
+])
+
+
+def _parse_user_profile(resp: dict) -> dict:
+    _raise_if_stale(resp)
+    if 'followers_count' not in resp:
+        raise HTTPException(400, f"Profile error: {resp}")
+    return {
+        "username": resp["username"],
+        "profile_picture_url": resp["profile_picture_url"],
+        "followers_count": resp["followers_count"],
+        "follows_count": resp["follows_count"],
+        "bio": resp.get("biography"),
+        "link_in_bio": resp.get("website"),
+        "media_count": resp.get("media_count"),  # ← include it in the returned dict
+        "profile_views": None                       # ← you can set this later when you fetch insights
+    }
+
+
+async def _fetch_user_profile(ig_user_id: str, token: str) -> dict:
+    url = f"{BASE_URL}/{API_VERSION}/{ig_user_id}"
+    params = {"fields": PROFILE_FIELDS, "access_token": token}
+    return _parse_user_profile(await graph_get(url, params))
+
+
+# --- Insight fetchers ---
+METRIC_DEFS = {
+    'time_series': 'follower_count,reach',
+    'total_values': 'views,accounts_engaged,comments,likes,saves,shares,total_interactions'
+}
+
+# (metric, period, metric_type) asked for by each insights-backed section
+INSIGHT_REQUESTS = {
+    'profile_views': ('profile_views', 'day', 'total_value'),
+    'time_series': (METRIC_DEFS['time_series'], 'day', None),
+    'total_values': (METRIC_DEFS['total_values'], 'day', 'total_value'),
+    'daily_reach': ('reach', 'day', None),
+    'daily_views': ('views', 'day', 'total_value'),
+    'online_followers': ('online_followers', 'lifetime', None),
+    'website_clicks': ('website_clicks', 'day', 'total_value'),
+}
+
+
+async def _fetch_insights(ig_user_id: str, token: str, section: str) -> dict:
+    metric, period, metric_type = INSIGHT_REQUESTS[section]
+    url = f"{BASE_URL}/{API_VERSION}/{ig_user_id}/insights"
+    params = {"metric": metric, "period": period, "access_token": token}
+    if metric_type:
+        params["metric_type"] = metric_type
+    return await graph_get(url, params)
+
+
+def _parse_time_series(resp: dict):
+    if 'data' not in resp:
+        raise HTTPException(400, f"Time series error: {resp}")
+    return resp['data']
+
+def _parse_total_values(resp: dict):
+    if 'data' not in resp:
+        raise HTTPException(400, f"Total values error: {resp}")
+    return resp['data']
+
+# --- Media fetcher ---
+# Media are synced into the DB by app.services.ig_media (only young posts'
+# counts and insights are refreshed) and the newest IG_RECENT_MEDIA are read
+# back from there.
+IG_RECENT_MEDIA = int(os.getenv("IG_RECENT_MEDIA", "25"))
+
+
+def _load_recent_media(email: str, ig_user_id: str, token: str) -> List[dict]:
+    try:
+        sync_media(email, ig_user_id, token, inline_insights=IG_RECENT_MEDIA)
+    except GraphAPIError as e:
+        if _is_invalid_object({"error": e.error}):
+            raise StaleInstagramAccount(e.error.get("message"))
+        raise HTTPException(400, f"Media error: {e.error}")
+    return read_recent_media(ig_user_id, IG_RECENT_MEDIA)
+
+
+async def _fetch_recent_media(email: str, ig_user_id: str, token: str) -> List[dict]:
+    return await run_in_threadpool(_load_recent_media, email, ig_user_id, token)
+# --- Audience & Actions Insights fetchers ---
+def _parse_daily_reach(resp: dict) -> int:
+    if 'data' not in resp:
+        raise HTTPException(400, f"Daily reach error: {resp}")
+    return resp['data'][0]['values'][0]['value']
+
+
+def _parse_online_followers(resp: dict) -> int:
+    if 'data' not in resp:
+        raise HTTPException(400, f"Online followers error: {resp}")
+    return resp['data'][0]['values'][0]['value']
+
+
+def _parse_total_value(resp: dict) -> int:
+    # Shared by daily views, profile views and website clicks
+    data = resp.get('data')
+    if not data or 'total_value' not in data[0]:
+        return 0
+    return data[0]['total_value'].get('value', 0)
+
+
+INSIGHT_PARSERS = {
+    'profile_views': _parse_total_value,
+    'time_series': _parse_time_series,
+    'total_values': _parse_total_values,
+    'daily_reach': _parse_daily_reach,
+    'daily_views': _parse_total_value,
+    'online_followers': _parse_online_followers,
+    'website_clicks': _parse_total_value,
+}
+
+
+def _parse_insights(section: str, resp: dict):
+    # A stale account id fails every section alike, including the lenient
+    # ones, so it is re-resolved instead of surfacing as a section error
+    _raise_if_stale(resp)
+    return INSIGHT_PARSERS[section](resp)
+
+
+# --- Dashboard fetch plans ---
+# Batch mode merges the insights metrics into one call per
+# (period, metric_type) and sends those plus the profile read as one Graph
+# batch POST; a merged call that errors is retried as one call per
+# section. Otherwise every section is its own concurrent GET. Either way
+# the media sync runs alongside. Only the parts the requested dashboard
+# sections are computed from are fetched (see DASHBOARD_SECTIONS).
+IG_GRAPH_BATCH = os.getenv("IG_GRAPH_BATCH", "true").lower() == "true"
+
+
+async def _graph_batch(relative_urls: List[str], token: str) -> List[dict]:
+    resp = await get_async_client().post(
+        f"{BASE_URL}/{API_VERSION}/",
+        data=batch_payload(token, relative_urls),
+    )
+    return parse_batch_response(resp.json(), len(relative_urls))
+
+
+async def _fetch_graph_batched(ig_user_id: str, token: str, parts: Set[str]) -> dict:
+    insights = [section for section in INSIGHT_REQUESTS if section in parts]
+    calls = plan_insights(INSIGHT_REQUESTS[section] for section in insights)
+    urls = [insights_relative_url(ig_user_id, call) for call in calls]
+    if "profile" in parts:
+        urls.insert(0, relative_url(ig_user_id, {"fields": PROFILE_FIELDS}))
+    responses = await _graph_batch(urls, token)
+
+    sections = {}
+    if "profile" in parts:
+        sections["profile"] = _parse_user_profile(responses.pop(0))
+    by_group = {(call.period, call.metric_type): resp for call, resp in zip(calls, responses)}
+    for resp in by_group.values():
+        _raise_if_stale(resp)
+    group_of = {section: INSIGHT_REQUESTS[section][1:] for section in insights}
+    shared = Counter(group_of.values())
+
+    # One rejected metric errors its whole merged call, so a lenient section
+    # (e.g. website_clicks) would take the strict total_values down with it.
+    # Sections of a failed merged call are asked for again on their own.
+    retry = [
+        section for section in insights
+        if shared[group_of[section]] > 1 and "data" not in by_group[group_of[section]]
+    ]
+    own = {}
+    if retry:
+        urls = [insights_relative_url(ig_user_id, plan_insights([INSIGHT_REQUESTS[section]])[0]) for section in retry]
+        own = dict(zip(retry, await _graph_batch(urls, token)))
+
+    for section in insights:
+        metric = INSIGHT_REQUESTS[section][0]
+        resp = own[section] if section in own else select_metrics(by_group[group_of[section]], metric)
+        sections[section] = _parse_insights(section, resp)
+    return sections
+
+
+async def _fetch_graph_concurrent(ig_user_id: str, token: str, parts: Set[str]) -> dict:
+    async def insight(section: str):
+        return _parse_insights(section, await _fetch_insights(ig_user_id, token, section))
+
+    fetches = {section: insight(section) for section in INSIGHT_REQUESTS if section in parts}
+    if "profile" in parts:
+        fetches["profile"] = _fetch_user_profile(ig_user_id, token)
+    results = await asyncio.gather(*fetches.values())
+    return dict(zip(fetches, results))
+
+
+async def _fetch_graph_sections(ig_user_id: str, token: str, parts: Set[str]) -> dict:
+    """Profile and insights parts (everything but media)."""
+    if IG_GRAPH_BATCH:
+        return await _fetch_graph_batched(ig_user_id, token, parts)
+    return await _fetch_graph_concurrent(ig_user_id, token, parts)
+
+
+async def _fetch_dashboard_sections(email: str, ig_user_id: str, token: str, parts: Set[str]) -> dict:
+    fetches = []
+    if parts - {"recent_media"}:
+        fetches.append(_fetch_graph_sections(ig_user_id, token, parts))
+    if "recent_media" in parts:
+        fetches.append(_fetch_recent_media(email, ig_user_id, token))
+    results = await asyncio.gather(*fetches)
+    sections = results[0] if parts - {"recent_media"} else {}
+    if "recent_media" in parts:
+        sections["recent_media"] = results[-1]
+    return sections
+
+
+# --- Dashboard transforms ---
+# One per DashboardData field, computed from the fetched parts.
+def _profile(sections: dict) -> dict:
+    # Merge profile and profile views
+    return {**sections["profile"], "profile_views": sections["profile_views"]}
+
+
+def _user_insights(sections: dict) -> List[dict]:
+    ts = sections["time_series"]
+    tv = sections["total_values"]
+    dates = [pt['end_time'][:10] for pt in ts[0]['values']]
+
+    insights = []
+    for idx, dt in enumerate(dates):
+        row = {m['name']: m['values'][idx]['value'] for m in ts}
+        for m in tv:
+            row[m['name']] = m.get('total_value', {}).get('value', 0)
+        insights.append({"date": dt, **row})
+    return insights
+
+
+def _top_media(sections: dict) -> List[dict]:
+    # Top media by impressions
+    return sorted(sections["recent_media"], key=lambda m: m["impressions"] or 0, reverse=True)[:5]
+
+
+def _audience_insights(sections: dict) -> dict:
+    return {
+        "reach": sections["daily_reach"],
+        "views": sections["daily_views"],
+        "online_followers": sections["online_followers"],
+        "profile_views": sections["profile_views"],
+        "website_clicks": sections["website_clicks"],
+    }
+
+
+def _engagement_rate(sections: dict) -> Optional[float]:
+    media = sections["recent_media"]
+    followers_count = sections["profile"]["followers_count"]
+    if media and followers_count:
+        total_engagements = sum(m["like_count"] + m["comments_count"] for m in media)
+        return round((total_engagements / (len(media) * followers_count)) * 100, 2)
+    return None
+
+
+# Each dashboard section with the parts it needs ("profile" is the profile
+# read, "recent_media" the media sync, the rest are INSIGHT_REQUESTS) and
+# its transform, in DashboardData field order
+DASHBOARD_SECTIONS = {
+    "profile": (("profile", "profile_views"), _profile),
+    "user_insights": (("time_series", "total_values"), _user_insights),
+    "recent_media": (("recent_media",), lambda sections: sections["recent_media"]),
+    "top_media": (("recent_media",), _top_media),
+    "total_followers": (("profile",), lambda sections: sections["profile"]["followers_count"]),
+    "audience_insights": (
+        ("daily_reach", "daily_views", "online_followers", "profile_views", "website_clicks"),
+        _audience_insights,
+    ),
+    "engagement_rate": (("recent_media", "profile"), _engagement_rate),
+}
+
+
+def _plan_parts(requested: Tuple[str, ...]) -> Set[str]:
+    return {part for section in requested for part in DASHBOARD_SECTIONS[section][0]}
+
+
+# --- Dashboard build ---
+# Concurrent builds for the same user (several tabs, a double mount, a
+# revalidation racing a live request) share one run of the fetcher chain
+_dashboard_flight = AsyncSingleFlight("instagram_dashboard")
+
+
+async def build_instagram_dashboard(
+    db: AsyncSession, email: str, sections: Optional[Tuple[str, ...]] = None
+) -> DashboardData:
+    """Build the dashboard (or only `sections`) from upstream, coalescing concurrent builds."""
+    return await _dashboard_flight.do(
+        (email, sections), lambda: _build_instagram_dashboard(db, email, sections)
+    )
+
+
+async def _build_instagram_dashboard(
+    db: AsyncSession, email: str, sections: Optional[Tuple[str, ...]] = None
+) -> DashboardData:
+    """
+    Build the dashboard from upstream (also used by the prefetch scheduler).
+    - recent_media: newest stored media with insights (synced incrementally)
+    - top_media: top 5 by impressions
+    - the IG user id comes from the user record and is only resolved
+      upstream when missing or stale
+    - sections come from one Graph batch (or concurrent calls with
+      IG_GRAPH_BATCH=false); with `sections`, only what those need is
+      fetched and computed and the other fields are left out
+    """
+    requested = sections or tuple(DASHBOARD_SECTIONS)
+    parts = _plan_parts(requested)
+    token, ig_user_id = await get_instagram_account(db=db, email=email)
+    if not token:
+        raise HTTPException(401, "No Instagram token; please connect your account.")
+    if not ig_user_id:
+        ig_user_id = await _get_ig_user_id(token, email)
+
+    try:
+        fetched = await _fetch_dashboard_sections(email, ig_user_id, token, parts)
+    except StaleInstagramAccount:
+        ig_user_id = await _get_ig_user_id(token, email)
+        fetched = await _fetch_dashboard_sections(email, ig_user_id, token, parts)
+    if "user_insights" in requested:
+        await run_in_threadpool(
+            store_daily_insights, email, ig_user_id, fetched["time_series"], fetched["total_values"]
+        )
+
+    # The whole payload is validated once here and serialized directly
+    # afterwards instead of FastAPI validating it again
+    return validate(DashboardData, {
+        section: DASHBOARD_SECTIONS[section][1](fetched) for section in requested
+    })
+
+
+async def iter_instagram_sections(
+    email: str, token: str, ig_user_id: Optional[str], sections: Optional[Tuple[str, ...]] = None
+) -> AsyncIterator[Tuple[str, dict]]:
+    """
+    Yield (section, fragment) as soon as the parts each section needs have
+    arrived from the Graph call or the media sync. The full dashboard is
+    then stored as a new snapshot. A fetch failing on a stale IG user id
+    is retried once with a re-resolved id.
+    """
+    requested = sections or tuple(DASHBOARD_SECTIONS)
+    parts = _plan_parts(requested)
+    if not ig_user_id:
+        ig_user_id = await _get_ig_user_id(token, email)
+    fetchers = {}
+    if parts - {"recent_media"}:
+        fetchers["graph"] = lambda account_id: _fetch_graph_sections(account_id, token, parts)
+    if "recent_media" in parts:
+        fetchers["media"] = lambda account_id: _fetch_recent_media(email, account_id, token)
+    pending = {asyncio.ensure_future(fetch(ig_user_id)): (kind, ig_user_id) for kind, fetch in fetchers.items()}
+    retried = set()
+    fetched = {}
+    body = {}
+    try:
+        while pending:
+            done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                kind, account_id = pending.pop(task)
+                try:
+                    result = task.result()
+                except StaleInstagramAccount:
+                    if kind in retried:
+                        raise
+                    retried.add(kind)
+                    if account_id == ig_user_id:
+                        ig_user_id = await _get_ig_user_id(token, email)
+                    pending[asyncio.ensure_future(fetchers[kind](ig_user_id))] = (kind, ig_user_id)
+                    continue
+
+                if kind == "graph":
+                    if "user_insights" in requested:
+                        await run_in_threadpool(
+                            store_daily_insights, email, account_id, result["time_series"], result["total_values"]
+                        )
+                    fetched.update(result)
+                else:
+                    fetched["recent_media"] = result
+                for section in requested:
+                    needs, transform = DASHBOARD_SECTIONS[section]
+                    if section not in body and all(part in fetched for part in needs):
+                        body[section] = transform(fetched)
+                        yield section, {section: body[section]}
+    finally:
+        for task in pending:
+            task.cancel()
+
+    if sections is None:
+        dashboard = validate(DashboardData, body)
+        await run_in_threadpool(save_snapshot, email, "instagram", INSTAGRAM_PARAMS_KEY, dump_model(DashboardData, dashboard))
+
+
+async def rebuild_instagram_snapshot(email: str) -> None:
+    """Build the dashboard on its own session and store it as the next snapshot."""
+    async with AsyncSessionLocal() as db:
+        dashboard = await build_instagram_dashboard(db, email)
+    body = dump_model(DashboardData, dashboard)
+    await run_in_threadpool(save_snapshot, email, "instagram", INSTAGRAM_PARAMS_KEY, body)
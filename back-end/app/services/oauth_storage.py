@@ -10,29 +10,58 @@ load_dotenv()  # loads environment variables from .env into os.environ
 
 # You can store it globally for now if testing only one user
 import os
-from app.db.session import SessionLocal
+from app.core.cache import TTLCache
+from app.core.http import get_session
 from app.models.models import User
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional, Tuple
+from datetime import datetime
+import hashlib
 
 APP_ID = os.getenv("FB_APP_ID")
 APP_SECRET = os.getenv("FB_APP_SECRET")
 
 
-db = SessionLocal()
 # oauth_storage.py
-def get_instagram_token(db: Session, email: str) -> str | None:
+async def get_instagram_token(db: AsyncSession, email: str) -> str | None:
     """Retrieve Instagram access token from database"""
     try:
-        record = db.query(User).filter(User.email == email).first()
-        return record.access_token if record else None
+        return (await db.execute(select(User.access_token).where(User.email == email))).scalar()
     except Exception as e:
         print(f"Database error: {str(e)}")
         return None
 
 
+async def get_instagram_account(db: AsyncSession, email: str) -> Tuple[Optional[str], Optional[str]]:
+    """Return (access_token, stored instagram_user_id) for a user in one query"""
+    try:
+        record = (await db.execute(
+            select(User.access_token, User.instagram_user_id).where(User.email == email)
+        )).first()
+        return (record.access_token, record.instagram_user_id) if record else (None, None)
+    except Exception as e:
+        print(f"Database error: {str(e)}")
+        return None, None
+
+
 import requests
-def check_token_validity(access_token: str) -> bool:
-    """Check if Instagram access token is valid"""
+
+# debug_token results, keyed by a hash of the token. Filled on demand here
+# and ahead of time by the token refresh scheduler.
+IG_TOKEN_STATUS_TTL = int(os.getenv("IG_TOKEN_STATUS_TTL", "900"))
+_token_status_cache = TTLCache("instagram_token_status", 1024)
+
+
+def _token_key(access_token: str) -> str:
+    return hashlib.sha256(access_token.encode()).hexdigest()
+
+
+def debug_token(access_token: str) -> Optional[dict]:
+    """Ask Facebook about a token: {"valid": bool, "expires_at": datetime | None}.
+
+    Returns None if the request itself failed, and caches the answer otherwise.
+    """
     try:
         url = "https://graph.facebook.com/v19.0/debug_token"
         params = {
@@ -40,30 +69,41 @@ def check_token_validity(access_token: str) -> bool:
             "access_token": f"{APP_ID}|{APP_SECRET}"
         }
         
-        response = requests.get(url, params=params)
+        response = get_session().get(url, params=params)
         response.raise_for_status()
         data = response.json()
         
         if "error" in data:
             print(f"Token error: {data['error']['message']}")
-            return False
-            
-        token_data = data.get('data', {})
-        
-        # Handle potential missing expires_at field
-        if 'expires_at' in token_data:
-            print(f"Token valid until: {token_data['expires_at']}")
-            return True
-            
-        print("Token is valid with no expiration")
-        return True
+            status = {"valid": False, "expires_at": None}
+        else:
+            token_data = data.get('data', {})
+            # expires_at of 0 means the token never expires
+            expires_at = token_data.get('expires_at') or None
+            status = {
+                "valid": bool(token_data.get('is_valid', True)),
+                "expires_at": datetime.utcfromtimestamp(expires_at) if expires_at else None,
+            }
+        _token_status_cache.set(_token_key(access_token), status, IG_TOKEN_STATUS_TTL)
+        return status
         
     except requests.exceptions.RequestException as e:
         print(f"API request failed: {str(e)}")
-        return False
+        return None
     except KeyError as e:
         print(f"Unexpected response format: {str(e)}")
-        return False
+        return None
+
+
+def cached_token_status(access_token: str) -> Optional[dict]:
+    """Last known debug_token result for a token, without calling Facebook"""
+    return _token_status_cache.get(_token_key(access_token))
+
+
+def check_token_validity(access_token: str) -> bool:
+    """Check if Instagram access token is valid (cached for IG_TOKEN_STATUS_TTL)"""
+    status = cached_token_status(access_token) or debug_token(access_token)
+    return bool(status and status["valid"])
 # Example usage
 # access_token = 'YOUR_LONG_LIVED_ACCESS_TOKEN'  # Replace with your token
 # check_token_validity(access_token)
@@ -81,7 +121,7 @@ def refresh_long_lived_token(expired_token: str) -> str | None:
             "fb_exchange_token": expired_token
         }
         
-        response = requests.get(url, params=params)
+        response = get_session().get(url, params=params)
         response.raise_for_status()
         data = response.json()
         
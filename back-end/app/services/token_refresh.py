@@ -0,0 +1,130 @@
+# app/services/token_refresh.py
+#
+# Background token upkeep for both providers. Every TOKEN_REFRESH_INTERVAL
+# seconds it renews Google tokens that expire within YT_REFRESH_LEAD seconds
+# (and warms the user's API clients), and checks Instagram tokens with
+# debug_token, exchanging those that expire within IG_REFRESH_LEAD_DAYS.
+# Request handlers then find valid tokens and cached validity results
+# instead of refreshing inline.
+#
+# Meant to run as one standalone process next to the web workers:
+#     python -m app.services.token_refresh
+# The Dockerfile starts exactly one alongside gunicorn. Starting it
+# in-process (TOKEN_REFRESH_ENABLED=true) runs one scheduler per gunicorn
+# worker, which all refresh the same tokens, so only enable that for
+# single-worker deployments without the standalone process.
+#
+# YT_REFRESH_LEAD must stay above YT_CLIENT_EXPIRY_MARGIN (yt_analytics_v2),
+# otherwise get_services reaches tokens first and refreshes them inline.
+
+import os
+import threading
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import or_
+
+from app.db.session import SessionLocal
+from app.models.models import User
+from app.services.oauth_storage import cached_token_status, debug_token, refresh_long_lived_token
+from app.services.yt_analytics_v2 import refresh_youtube_token
+
+TOKEN_REFRESH_ENABLED = os.getenv("TOKEN_REFRESH_ENABLED", "false").lower() == "true"
+TOKEN_REFRESH_INTERVAL = int(os.getenv("TOKEN_REFRESH_INTERVAL", "60"))
+YT_REFRESH_LEAD = int(os.getenv("YT_REFRESH_LEAD", "600"))
+IG_REFRESH_LEAD_DAYS = int(os.getenv("IG_REFRESH_LEAD_DAYS", "7"))
+
+
+def refresh_youtube_tokens(db) -> int:
+    """Refresh Google tokens that are missing an expiry or expire soon."""
+    cutoff = datetime.utcnow() + timedelta(seconds=YT_REFRESH_LEAD)
+    users = db.query(User).filter(
+        User.yt_is_connected == True,  # noqa: E712
+        User.yt_refresh_token.isnot(None),
+        or_(User.yt_expiry.is_(None), User.yt_expiry <= cutoff),
+    ).all()
+    refreshed = 0
+    for user in users:
+        try:
+            refreshed += refresh_youtube_token(db, user)
+        except Exception as e:
+            db.rollback()
+            print(f"YouTube token refresh failed for {user.email}: {e}")
+    return refreshed
+
+
+def refresh_instagram_tokens(db) -> int:
+    """Check Instagram tokens and exchange the ones close to expiry."""
+    cutoff = datetime.utcnow() + timedelta(days=IG_REFRESH_LEAD_DAYS)
+    users = db.query(User).filter(
+        User.ig_is_connected == True,  # noqa: E712
+        User.access_token.isnot(None),
+    ).all()
+    refreshed = 0
+    for user in users:
+        try:
+            status = cached_token_status(user.access_token) or debug_token(user.access_token)
+            if not status or not status["valid"] or not status["expires_at"]:
+                continue
+            if status["expires_at"] > cutoff:
+                continue
+            new_token = refresh_long_lived_token(user.access_token)
+            if new_token:
+                # Same account, so the stored page / IG ids stay valid
+                user.access_token = new_token
+                db.commit()
+                debug_token(new_token)
+                refreshed += 1
+        except Exception as e:
+            db.rollback()
+            print(f"Instagram token refresh failed for {user.email}: {e}")
+    return refreshed
+
+
+def run_once() -> dict:
+    db = SessionLocal()
+    try:
+        return {
+            "youtube": refresh_youtube_tokens(db),
+            "instagram": refresh_instagram_tokens(db),
+        }
+    finally:
+        db.close()
+
+
+class TokenRefreshScheduler:
+    """Daemon thread that calls run_once every `interval` seconds."""
+
+    def __init__(self, interval: int = TOKEN_REFRESH_INTERVAL):
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="token-refresh", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                run_once()
+            except Exception as e:
+                print(f"Token refresh pass failed: {e}")
+            self._stop.wait(self.interval)
+
+
+token_refresh_scheduler = TokenRefreshScheduler()
+
+
+if __name__ == "__main__":
+    scheduler = TokenRefreshScheduler()
+    scheduler._run()
@@ -4,17 +4,36 @@ import os
  # loads environment variables from .env into os.environ
 
 
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+import contextvars
 from datetime import date, datetime, timedelta
+from dateutil.relativedelta import relativedelta
+from functools import lru_cache, wraps
+import json
 import os
+import threading
 from fastapi import HTTPException, status
+from fastapi.concurrency import run_in_threadpool
 from google.auth.transport.requests import Request
 from google_auth_oauthlib.flow import Flow
-from googleapiclient.discovery import build
+from googleapiclient.discovery import build_from_document
+from googleapiclient.http import HttpRequest
+from google_auth_httplib2 import AuthorizedHttp
 from google.oauth2.credentials import Credentials
 from pydantic import BaseModel
-from app.db.session import SessionLocal
+from sqlalchemy import select
+from app.core.cache import TTLCache
+from app.core.serialization import dumps
+from app.core.singleflight import SingleFlight
+from app.services.auth_cache import invalidate_user
+from app.services.dashboard_snapshots import clear_snapshots, save_snapshot, youtube_params_key
+from app.core.http import get_httplib2, get_session
+from app.db.session import AsyncSessionLocal, SessionLocal
 from app.models.models import User
-from typing import Optional, Tuple
+from app.services.yt_catalog import clear_channel, sync_video_catalog
+from app.services.yt_warehouse import read_daily_metrics
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
 # In yt_analytics_v2.py
 from google.auth.exceptions import RefreshError  # Add this import
 client_id=os.getenv("analytics_client_id")
@@ -63,39 +82,209 @@ def get_authorization_url(email: str) -> str:
     return authorization_url
 
 # In your yt_analytics_v2.py
-def validate_authorization_code(code: str, email: str) -> bool:
+async def validate_authorization_code(code: str, email: str) -> bool:
     """Validate code without state"""
-    db = SessionLocal()
-    try:
-        user = db.query(User).filter_by(email=email).first()
-        if not user:
+    async with AsyncSessionLocal() as db:
+        try:
+            user = (await db.execute(select(User).filter_by(email=email))).scalars().first()
+            if not user:
+                return False
+
+            flow = Flow.from_client_config(
+                client_config=client_config,
+                scopes=SCOPES,
+                redirect_uri=REDIRECT_URI   
+            )
+            
+            # The code exchange is a blocking requests call
+            await run_in_threadpool(flow.fetch_token, code=code)
+            credentials = flow.credentials
+
+            user.yt_token = credentials.token
+            user.yt_refresh_token = credentials.refresh_token
+            user.yt_expiry = credentials.expiry
+            user.yt_is_connected = True
+            # Snapshots and the stored channel may belong to a previously
+            # connected channel
+            await db.execute(clear_snapshots(user.id, "youtube"))
+            for statement in clear_channel(user.id):
+                await db.execute(statement)
+            
+            await db.commit()
+            clear_cached_services(email)
+            invalidate_user(user.id)
+            return True
+        except Exception as e:
+            await db.rollback()
+            print(f"Authorization failed: {str(e)}")
             return False
 
-        flow = Flow.from_client_config(
-            client_config=client_config,
-            scopes=SCOPES,
-            redirect_uri=REDIRECT_URI   
-        )
         
-        flow.fetch_token(code=code)
-        credentials = flow.credentials
+# --- Per-user client cache ---
+# Building credentials and both discovery clients is the expensive part of
+# get_services, so the pair is kept per user until shortly before the token
+# expires. The margin is wider than google-auth's own refresh threshold, so
+# cached clients are dropped before their transports would refresh inline.
+YT_SERVICES_CACHE_SIZE = int(os.getenv("YT_SERVICES_CACHE_SIZE", "128"))
+YT_CLIENT_EXPIRY_MARGIN = int(os.getenv("YT_CLIENT_EXPIRY_MARGIN", "300"))
 
-        user.yt_token = credentials.token
-        user.yt_refresh_token = credentials.refresh_token
-        user.yt_expiry = credentials.expiry
-        user.yt_is_connected = True
-        
+
+class _ServicesCache:
+    """Thread-safe LRU of (youtubeAnalytics, youtube) client pairs keyed by email."""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._entries: "OrderedDict[str, Tuple[Tuple, Optional[datetime]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, email: str) -> Optional[Tuple]:
+        with self._lock:
+            entry = self._entries.get(email)
+            if entry is None:
+                return None
+            services, expiry = entry
+            if expiry is not None and expiry <= datetime.utcnow():
+                del self._entries[email]
+                return None
+            self._entries.move_to_end(email)
+            return services
+
+    def put(self, email: str, services: Tuple, expiry: Optional[datetime]) -> None:
+        with self._lock:
+            self._entries[email] = (services, expiry)
+            self._entries.move_to_end(email)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, email: Optional[str] = None) -> None:
+        with self._lock:
+            if email is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(email, None)
+
+
+_services_cache = _ServicesCache(YT_SERVICES_CACHE_SIZE)
+
+
+def clear_cached_services(email: str) -> None:
+    """Drop the cached clients and reports for a user, e.g. after connecting or disconnecting."""
+    _services_cache.invalidate(email)
+    _report_cache.invalidate_where(lambda key: key[0] == email)
+
+
+# Pinned discovery documents shipped in app/services/discovery. Building from
+# them never touches the network, and each one is parsed once per process.
+DISCOVERY_DIR = os.path.join(os.path.dirname(__file__), "discovery")
+
+
+@lru_cache(maxsize=None)
+def _discovery_document(api: str, version: str) -> dict:
+    with open(os.path.join(DISCOVERY_DIR, f"{api}.{version}.json"), encoding="utf-8") as f:
+        return json.load(f)
+
+
+def build_client(api: str, version: str, creds: Credentials, request_builder: Callable = HttpRequest):
+    return build_from_document(
+        _discovery_document(api, version),
+        credentials=creds,
+        requestBuilder=request_builder,
+    )
+
+
+def _request_builder(creds: Credentials) -> Callable:
+    # httplib2 connections are not thread-safe, so cached clients hand every
+    # request an authorized transport over the calling thread's own
+    # keep-alive Http instead of sharing one.
+    def build_request(http, *args, **kwargs):
+        return HttpRequest(AuthorizedHttp(creds, http=get_httplib2()), *args, **kwargs)
+    return build_request
+
+
+class _UserCredentials(Credentials):
+    """Google credentials that store every refreshed token on the user row.
+
+    Besides explicit refreshes, the cached clients' transports refresh on
+    their own after a 401; the new token is persisted either way instead of
+    living only in this worker's client cache.
+    """
+
+    def __init__(self, email: str, **kwargs):
+        super().__init__(**kwargs)
+        self._email = email
+
+    def refresh(self, request) -> None:
+        super().refresh(request)
+        db = SessionLocal()
+        try:
+            user = db.query(User).filter_by(email=self._email).first()
+            if user:
+                user.yt_token = self.token
+                user.yt_expiry = self.expiry
+                db.commit()
+        finally:
+            db.close()
+
+
+def _user_credentials(user: User) -> Credentials:
+    return _UserCredentials(
+        user.email,
+        token=user.yt_token,
+        refresh_token=user.yt_refresh_token,
+        token_uri='https://oauth2.googleapis.com/token',
+        client_id=client_id,
+        client_secret=client_secret,
+        expiry=user.yt_expiry,
+    )
+
+
+def _client_expiry(creds: Credentials) -> Optional[datetime]:
+    """When clients built on `creds` stop being served from the cache."""
+    if creds.expiry is None:
+        return None
+    return creds.expiry - timedelta(seconds=YT_CLIENT_EXPIRY_MARGIN)
+
+
+def _refresh_user_credentials(db, user: User, creds: Credentials) -> None:
+    """Refresh (and thereby persist) creds; marks the user disconnected on RefreshError."""
+    try:
+        creds.refresh(Request(session=get_session()))
+    except RefreshError:
+        user.yt_is_connected = False
         db.commit()
-        return True
-    except Exception as e:
-        db.rollback()
-        print(f"Authorization failed: {str(e)}")
+        _services_cache.invalidate(user.email)
+        invalidate_user(user.id)
+        raise
+
+
+def _build_services(creds: Credentials) -> Tuple:
+    request_builder = _request_builder(creds)
+    return (
+        build_client("youtubeAnalytics", "v2", creds, request_builder),
+        build_client("youtube", "v3", creds, request_builder)
+    )
+
+
+def refresh_youtube_token(db, user: User) -> bool:
+    """Renew a user's Google token ahead of expiry and warm their client cache.
+
+    Used by the token refresh scheduler so requests find valid credentials
+    and never refresh inline.
+    """
+    creds = _user_credentials(user)
+    try:
+        _refresh_user_credentials(db, user, creds)
+    except RefreshError:
         return False
-    finally:
-        db.close()
+    _services_cache.put(user.email, _build_services(creds), _client_expiry(creds))
+    return True
+
 
-        
 def get_services(email: str) -> Tuple:
+    services = _services_cache.get(email)
+    if services is not None:
+        return services
+
     db = SessionLocal()
     try:
         user = db.query(User).filter_by(email=email).first()
@@ -105,33 +294,23 @@ def get_services(email: str) -> Tuple:
                 detail="YouTube not connected"
             )
 
-        creds = Credentials(
-            token=user.yt_token,
-            refresh_token=user.yt_refresh_token,
-            token_uri='https://oauth2.googleapis.com/token',
-            client_id=client_id,
-            client_secret=client_secret,
-        )
+        creds = _user_credentials(user)
 
-        if not creds.valid:
+        expiry = _client_expiry(creds)
+        if not creds.valid or (expiry is not None and expiry <= datetime.utcnow()):
+            # Normally the refresh scheduler renews tokens before this point;
+            # this only runs if it is not running or fell behind.
             try:
-                creds.refresh(Request())
-                # Update credentials in database
-                user.yt_token = creds.token
-                user.yt_expiry = creds.expiry
-                db.commit()
+                _refresh_user_credentials(db, user, creds)
             except RefreshError:
-                user.yt_is_connected = False
-                db.commit()
                 raise HTTPException(
                     status_code=status.HTTP_401_UNAUTHORIZED,
                     detail="YouTube authorization expired"
                 )
 
-        return (
-            build("youtubeAnalytics", "v2", credentials=creds),
-            build("youtube", "v3", credentials=creds)
-        )
+        services = _build_services(creds)
+        _services_cache.put(email, services, _client_expiry(creds))
+        return services
     finally:
         db.close()
 
@@ -163,31 +342,142 @@ def validate_dates(start_date: str, end_date: str) -> tuple:
     
     return start_date, end_date
 
+
+def resolve_date_range(frequency: Optional[str], start_date: Optional[str], end_date: Optional[str]) -> tuple:
+    """Fill in the dashboard's default range for `frequency` and validate it."""
+    # Default end_date to 2 days ago (YouTube data delay)
+    today = datetime.utcnow().date()
+    max_end_date = today - timedelta(days=2)
+    end_date = end_date or max_end_date.isoformat()
+
+    # Validate end_date first
+    try:
+        end_date_obj = datetime.strptime(end_date, "%Y-%m-%d").date()
+    except ValueError:
+        raise HTTPException(400, "Invalid end_date format. Use YYYY-MM-DD")
+
+    # Calculate start_date based on frequency if not provided
+    if not start_date:
+        if frequency == "weekly":
+            start_date_obj = end_date_obj - timedelta(weeks=1)
+        elif frequency == "monthly":
+            start_date_obj = end_date_obj - relativedelta(months=1)
+        elif frequency == "yearly":
+            start_date_obj = end_date_obj - relativedelta(years=1)
+        elif frequency == "daily":
+            start_date_obj = end_date_obj - timedelta(days=1)
+        else:
+            raise HTTPException(400, "Invalid frequency parameter")
+        
+        start_date = start_date_obj.isoformat()
+
+    # Now validate both dates
+    return validate_dates(start_date, end_date)
+
+# --- Range-aware report cache ---
+# Reports for a range that ended more than YT_CLOSED_RANGE_DAYS ago no longer
+# change, so they are kept until LRU eviction. Ranges touching the last few
+# days are stale-while-revalidate, with a soft and a hard TTL per report:
+# past the soft TTL the cached report is still returned and a refresh runs
+# in the background; past the hard TTL it is fetched inline. Configure with
+# YT_<REPORT>_SOFT_TTL / YT_<REPORT>_HARD_TTL, e.g. YT_GEOGRAPHY_HARD_TTL.
+YT_REPORT_CACHE_SIZE = int(os.getenv("YT_REPORT_CACHE_SIZE", "1024"))
+YT_CLOSED_RANGE_DAYS = int(os.getenv("YT_CLOSED_RANGE_DAYS", "3"))
+YT_OPEN_RANGE_TTL = int(os.getenv("YT_OPEN_RANGE_TTL", "300"))
+
+
+def _report_ttls(report: str, soft: int, hard: int) -> Tuple[int, int]:
+    prefix = f"YT_{report.upper()}"
+    return int(os.getenv(f"{prefix}_SOFT_TTL", soft)), int(os.getenv(f"{prefix}_HARD_TTL", hard))
+
+
+# Daily metrics move during the day; audience breakdowns barely do
+YT_REPORT_TTLS: Dict[str, Tuple[int, int]] = {
+    "channel_metrics": _report_ttls("channel_metrics", YT_OPEN_RANGE_TTL, 3600),
+    "traffic_sources": _report_ttls("traffic_sources", 1800, 6 * 3600),
+    "demographics": _report_ttls("demographics", 3600, 24 * 3600),
+    "geography": _report_ttls("geography", 3600, 24 * 3600),
+}
+
+_report_cache = TTLCache("youtube_reports", YT_REPORT_CACHE_SIZE)
+# Concurrent misses for the same report share one upstream fetch
+_report_flight = SingleFlight("youtube_reports")
+_report_refreshing: set = set()
+_report_refreshing_lock = threading.Lock()
+# Set while a dashboard snapshot is rebuilt in the background, so the
+# rebuild fetches soft-expired reports instead of reusing them
+_skip_stale_reports: contextvars.ContextVar = contextvars.ContextVar("skip_stale_reports", default=False)
+
+
+def _is_closed_range(end_date: str) -> bool:
+    closed_before = datetime.utcnow().date() - timedelta(days=YT_CLOSED_RANGE_DAYS)
+    return datetime.strptime(end_date, "%Y-%m-%d").date() < closed_before
+
+
+def _refresh_report(key: Tuple, load: Callable[[], dict], hard_ttl: int) -> None:
+    """Reload one report on the fetch pool unless a refresh for it is already running."""
+    with _report_refreshing_lock:
+        if key in _report_refreshing:
+            return
+        _report_refreshing.add(key)
+
+    def run() -> None:
+        try:
+            _limited(key[0], _report_flight.do, key, lambda: _load_report(key, load, hard_ttl))
+        except Exception as e:
+            print(f"Background refresh of {key[1]} for {key[0]} failed: {e}")
+        finally:
+            with _report_refreshing_lock:
+                _report_refreshing.discard(key)
+
+    _fetch_executor.submit(run)
+
+
+def _load_report(key: Tuple, load: Callable[[], dict], hard_ttl: int) -> dict:
+    value = load()
+    _report_cache.set(key, value, hard_ttl)
+    return value
+
+
+def cached_report(report: str) -> Callable:
+    """Cache a fetcher's result per (user, report, start_date, end_date)."""
+    soft_ttl, hard_ttl = YT_REPORT_TTLS[report]
+
+    def decorator(fn: Callable) -> Callable:
+        @wraps(fn)
+        def wrapper(email, start_date: str, end_date: str) -> dict:
+            key = (email, report, start_date, end_date)
+            load = lambda: fn(email, start_date, end_date)
+            if _is_closed_range(end_date):
+                return _report_cache.get_or_load(key, lambda: _report_flight.do(key, load))
+            cached = _report_cache.get_with_age(key)
+            if cached is not None:
+                value, age = cached
+                if age < soft_ttl:
+                    return value
+                if not _skip_stale_reports.get():
+                    _refresh_report(key, load, hard_ttl)
+                    return value
+            return _report_flight.do(key, lambda: _load_report(key, load, hard_ttl))
+        return wrapper
+    return decorator
+
+
 # Update your fetch_channel_metrics function
+# Reads through the local daily-metrics warehouse (see yt_warehouse).
+@cached_report("channel_metrics")
 def fetch_channel_metrics(email, start_date: str, end_date: str) -> dict:
     try:
         start_date, end_date = validate_dates(start_date, end_date)
-        yt_analytics, _ = get_services(email)
-        return yt_analytics.reports().query(
-            ids='channel==MINE',
-            startDate=start_date,
-            endDate=end_date,
-            metrics=(
-                'views,estimatedMinutesWatched,averageViewDuration,'
-                'averageViewPercentage,subscribersGained,subscribersLost,'
-                'likes,dislikes,shares,comments'
-            ),
-            dimensions='day',
-            sort='day'
-        ).execute()
+        yt_analytics, yt_data = get_services(email)
+        return read_daily_metrics(email, yt_analytics, yt_data, start_date, end_date)
     except HTTPException:
         raise
+    except RefreshError:
+        raise
     except Exception as e:
         raise HTTPException(502, f"YouTube Analytics error: {e}")
     
-channel_id = {
-    'id':None
-}    
 def fetch_channel_info(email) -> dict:
     """Fetch basic channel information"""
     try:
@@ -201,7 +491,6 @@ def fetch_channel_info(email) -> dict:
 
         print('fetch_channel_info')
         channel = response["items"][0]
-        channel_id['id'] = channel["id"]
         return {
             "channel_info": {
                 "id": channel["id"],
@@ -213,99 +502,180 @@ def fetch_channel_info(email) -> dict:
                 "total_videos": int(channel["statistics"]["videoCount"])
             }
         }
+    except RefreshError:
+        raise
     except Exception as e:
         property(e)
         raise HTTPException(502, f"YouTube Data error: {str(e)}")
 import isodate  # pip install isodate
 
 def fetch_all_videos(email: str) -> list:
-    """Get ALL uploaded videos using YouTube Data API"""
+    """Get ALL uploaded video ids (newest first) from the synced video catalog"""
     try:
         _, yt_data = get_services(email)
-        
-        all_videos = []
-        next_page_token = None
-        
-        while True:
-            # Fetch videos from your channel's uploads
-            request = yt_data.search().list(
-                part="snippet",
-                channelId=channel_id['id'],  # Use your actual channel ID
-                type="video",
-                maxResults=50,
-                order="date",
-                pageToken=next_page_token
-            )
-            response = request.execute()
-            
-            # Collect video IDs
-            for item in response.get("items", []):
-                if item["id"]["kind"] == "youtube#video":
-                    all_videos.append(item["id"]["videoId"])
-            
-            next_page_token = response.get("nextPageToken")
-            if not next_page_token:
-                break
-
-        return all_videos
+        return sync_video_catalog(email, yt_data)
 
+    except RefreshError:
+        raise
     except Exception as e:
         raise HTTPException(500, f"Failed to fetch videos: {str(e)}")
-def fetch_top_videos(email, start_date: str, end_date: str, max_results: int = 5) -> dict:
+# --- Chunked video lookups ---
+# videos.list accepts at most 50 ids per call and long Analytics filter
+# expressions blow past URL limits, so big catalogs are split into chunks.
+# videos.list chunks go out together as Data API batch requests; Analytics
+# chunks run as parallel calls.
+VIDEOS_LIST_CHUNK = 50
+ANALYTICS_FILTER_CHUNK = 200
+BATCH_MAX_REQUESTS = 50
+YT_CHUNK_WORKERS = int(os.getenv("YT_CHUNK_WORKERS", "8"))
+
+_chunk_executor = ThreadPoolExecutor(max_workers=YT_CHUNK_WORKERS, thread_name_prefix="yt-chunk")
+
+
+def _chunks(items: List[str], size: int) -> List[List[str]]:
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
+def _execute_batched(service, requests: List) -> List[dict]:
+    """Execute requests as BatchHttpRequests, returning responses in order."""
+    responses: List[Optional[dict]] = [None] * len(requests)
+    errors: List[Exception] = []
+
+    def callback(request_id, response, exception):
+        if exception is not None:
+            errors.append(exception)
+        else:
+            responses[int(request_id)] = response
+
+    for start in range(0, len(requests), BATCH_MAX_REQUESTS):
+        batch = service.new_batch_http_request(callback=callback)
+        for offset, request in enumerate(requests[start:start + BATCH_MAX_REQUESTS]):
+            batch.add(request, request_id=str(start + offset))
+        batch.execute()
+        if errors:
+            raise errors[0]
+    return responses
+
+
+def fetch_video_metadata(yt_data, video_ids: List[str]) -> List[dict]:
+    """videos.list for any number of ids, 50 per sub-request, batched."""
+    requests = [
+        yt_data.videos().list(part='snippet,statistics,contentDetails', id=','.join(chunk))
+        for chunk in _chunks(video_ids, VIDEOS_LIST_CHUNK)
+    ]
+    items = []
+    for response in _execute_batched(yt_data, requests):
+        items.extend(response.get('items', []))
+    return items
+
+
+def fetch_video_analytics(yt_analytics, video_ids: List[str], start_date: str, end_date: str) -> dict:
+    """Per-video views and watch time, one Analytics query per id chunk in parallel."""
+    def query(chunk):
+        return yt_analytics.reports().query(
+            ids='channel==MINE',
+            startDate=start_date,
+            endDate=end_date,
+            metrics='views,estimatedMinutesWatched',
+            dimensions='video',
+            filters=f"video=={','.join(chunk)}"
+        ).execute().get('rows', [])
+
+    analytics_data = {}
+    for rows in _chunk_executor.map(query, _chunks(video_ids, ANALYTICS_FILTER_CHUNK)):
+        analytics_data.update({row[0]: row[1:] for row in rows})
+    return analytics_data
+
+
+def _merge_top_videos(meta_resp: List[dict], analytics_data: dict, max_results: int) -> dict:
+    # Build combined response
+    videos = []
+    for meta in meta_resp:
+        vid_id = meta["id"]
+        analytics = analytics_data.get(vid_id, [0, 0])  # Default to 0 views
+        
+        videos.append({
+            "id": vid_id,
+            "title": meta["snippet"]["title"],
+            "thumbnail": meta["snippet"]["thumbnails"]["default"]["url"],
+            "views": int(analytics[0]) if analytics else 0,
+            "watch_time": int(analytics[1]) if analytics else 0,
+            "likes": int(meta["statistics"].get("likeCount", 0)),
+            "comments": int(meta["statistics"].get("commentCount", 0)),
+        })
+    
+    # Sort by views descending
+    sorted_videos = sorted(videos, key=lambda x: x["views"], reverse=True)
+    
+    return {'top_videos': sorted_videos[:max_results]}
+
+
+def _fetch_top_videos_full(email, yt_analytics, yt_data, start_date: str, end_date: str, max_results: int) -> dict:
+    # Get ALL video IDs (including 0-view videos)
+    all_video_ids = fetch_all_videos(email)
+    
+    # Fetch metadata for all videos
+    meta_resp = fetch_video_metadata(yt_data, all_video_ids)
+    
+    # Get metrics for videos with views (from Analytics API)
+    analytics_data = {}
+    if all_video_ids:
+        try:
+            analytics_data = fetch_video_analytics(yt_analytics, all_video_ids, start_date, end_date)
+        except RefreshError:
+            raise
+        except Exception as e:
+            # Handle case where no analytics data exists
+            pass
+    
+    return _merge_top_videos(meta_resp, analytics_data, max_results)
+
+
+def _fetch_top_videos_ranked(email, yt_analytics, yt_data, start_date: str, end_date: str, max_results: int) -> dict:
+    # Let Analytics rank by views and only hydrate the winners.
+    rows = yt_analytics.reports().query(
+        ids='channel==MINE',
+        startDate=start_date,
+        endDate=end_date,
+        metrics='views,estimatedMinutesWatched',
+        dimensions='video',
+        sort='-views',
+        maxResults=max_results
+    ).execute().get('rows', [])
+    analytics_data = {row[0]: row[1:] for row in rows}
+    video_ids = list(analytics_data)
+
+    # Backfill with 0-view uploads only when fewer than N videos had views
+    if len(video_ids) < max_results:
+        for vid_id in fetch_all_videos(email):
+            if vid_id not in analytics_data:
+                video_ids.append(vid_id)
+                if len(video_ids) == max_results:
+                    break
+
+    meta_resp = fetch_video_metadata(yt_data, video_ids)
+    return _merge_top_videos(meta_resp, analytics_data, max_results)
+
+
+# "ranked" asks Analytics for the top N directly (O(N));
+# "full" scores the whole catalog (O(catalog)).
+YT_TOP_VIDEOS_MODE = os.getenv("YT_TOP_VIDEOS_MODE", "ranked")
+
+
+def fetch_top_videos(email, start_date: str, end_date: str, max_results: int = 5, mode: Optional[str] = None) -> dict:
     try:
 
         yt_analytics, yt_data = get_services(email)
-        
-        # Get ALL video IDs (including 0-view videos)
-        all_video_ids = fetch_all_videos(email)
-        
-        # Fetch metadata for all videos
-        meta_resp = yt_data.videos().list(
-            part='snippet,statistics,contentDetails',
-            id=','.join(all_video_ids)
-        ).execute().get('items', [])
-        
-        # Get metrics for videos with views (from Analytics API)
-        analytics_data = {}
-        if all_video_ids:
-            try:
-                analytics_rows = yt_analytics.reports().query(
-                    ids='channel==MINE',
-                    startDate=start_date,
-                    endDate=end_date,
-                    metrics='views,estimatedMinutesWatched',
-                    dimensions='video',
-                    filters=f"video=={','.join(all_video_ids)}"
-                ).execute().get('rows', [])
-                analytics_data = {row[0]: row[1:] for row in analytics_rows}
-            except Exception as e:
-                # Handle case where no analytics data exists
-                pass
-        
-        # Build combined response
-        videos = []
-        for meta in meta_resp:
-            vid_id = meta["id"]
-            analytics = analytics_data.get(vid_id, [0, 0])  # Default to 0 views
-            
-            videos.append({
-                "id": vid_id,
-                "title": meta["snippet"]["title"],
-                "thumbnail": meta["snippet"]["thumbnails"]["default"]["url"],
-                "views": int(analytics[0]) if analytics else 0,
-                "watch_time": int(analytics[1]) if analytics else 0,
-                "likes": int(meta["statistics"].get("likeCount", 0)),
-                "comments": int(meta["statistics"].get("commentCount", 0)),
-            })
-        
-        # Sort by views descending
-        sorted_videos = sorted(videos, key=lambda x: x["views"], reverse=True)
-        
-        return {'top_videos': sorted_videos[:max_results]}
+        if (mode or YT_TOP_VIDEOS_MODE) == "full":
+            return _fetch_top_videos_full(email, yt_analytics, yt_data, start_date, end_date, max_results)
+        return _fetch_top_videos_ranked(email, yt_analytics, yt_data, start_date, end_date, max_results)
     
+    except RefreshError:
+        raise
     except Exception as e:
         raise HTTPException(502, f"YouTube Data error: {e}")
     
+@cached_report("demographics")
 def fetch_demographics(email,start_date: str, end_date: str) -> dict:
     try:
         yt_analytics, _ = get_services(email)
@@ -317,9 +687,12 @@ def fetch_demographics(email,start_date: str, end_date: str) -> dict:
             dimensions='ageGroup,gender'
         ).execute()
         return {'demographics': resp.get('rows', [])}
+    except RefreshError:
+        raise
     except Exception as e:
         raise HTTPException(502, f"YouTube Analytics error: {e}")
 
+@cached_report("traffic_sources")
 def fetch_traffic_sources(email,start_date: str, end_date: str) -> dict:
     try:
         yt_analytics, _ = get_services(email)
@@ -331,9 +704,12 @@ def fetch_traffic_sources(email,start_date: str, end_date: str) -> dict:
             dimensions='insightTrafficSourceType'
         ).execute()
         return {'traffic_sources': resp.get('rows', [])}
+    except RefreshError:
+        raise
     except Exception as e:
         raise HTTPException(502, f"YouTube Analytics error: {e}")
 
+@cached_report("geography")
 def fetch_geography(email,start_date: str, end_date: str) -> dict:
     try:
         yt_analytics, _ = get_services(email)
@@ -345,23 +721,147 @@ def fetch_geography(email,start_date: str, end_date: str) -> dict:
             dimensions='country'
         ).execute()
         return {'geography': resp.get('rows', [])}
+    except RefreshError:
+        raise
     except Exception as e:
         raise HTTPException(502, f"YouTube Analytics error: {e}")
 
-def fetch_dashboard_data(email:str,start_date: str, end_date: str) -> dict:
-    print('lmaooo')
+# --- Concurrent dashboard fan-out ---
+# The reports are independent of each other, so they all overlap. Each
+# user gets a semaphore so one dashboard (or several open tabs) can't take
+# more than YT_USER_CONCURRENCY upstream calls at a time.
+YT_DASHBOARD_CONCURRENT = os.getenv("YT_DASHBOARD_CONCURRENT", "true").lower() == "true"
+YT_USER_CONCURRENCY = int(os.getenv("YT_USER_CONCURRENCY", "4"))
+YT_FETCH_WORKERS = int(os.getenv("YT_FETCH_WORKERS", "16"))
+
+_fetch_executor = ThreadPoolExecutor(max_workers=YT_FETCH_WORKERS, thread_name_prefix="yt-fetch")
+_user_semaphores: Dict[str, threading.BoundedSemaphore] = {}
+_user_semaphores_lock = threading.Lock()
+
+
+def _user_semaphore(email: str) -> threading.BoundedSemaphore:
+    with _user_semaphores_lock:
+        sem = _user_semaphores.get(email)
+        if sem is None:
+            sem = _user_semaphores[email] = threading.BoundedSemaphore(YT_USER_CONCURRENCY)
+        return sem
+
+
+def _limited(email: str, fn: Callable, *args):
+    with _user_semaphore(email):
+        return fn(*args)
+
+
+def _submit(email: str, fn: Callable, *args):
+    # Each task runs in a copy of the caller's context (see _skip_stale_reports)
+    return _fetch_executor.submit(contextvars.copy_context().run, _limited, email, fn, *args)
+
+
+# Dashboard sections in response order. Looked up at call time so each
+# entry goes through the module's (cached) fetcher.
+_SECTION_FETCHERS: Dict[str, Callable[[str, str, str], dict]] = {
+    "channel_info": lambda email, start_date, end_date: fetch_channel_info(email),
+    "channel_metrics": lambda email, start_date, end_date: fetch_channel_metrics(email, start_date, end_date),
+    "top_videos": lambda email, start_date, end_date: fetch_top_videos(email, start_date, end_date),
+    "demographics": lambda email, start_date, end_date: fetch_demographics(email, start_date, end_date),
+    "traffic_sources": lambda email, start_date, end_date: fetch_traffic_sources(email, start_date, end_date),
+    "geography": lambda email, start_date, end_date: fetch_geography(email, start_date, end_date),
+}
+DASHBOARD_SECTIONS = tuple(_SECTION_FETCHERS)
+
+
+def _submit_sections(email: str, start_date: str, end_date: str, sections: Tuple[str, ...]) -> Dict[str, Future]:
+    return {
+        section: _submit(email, _SECTION_FETCHERS[section], email, start_date, end_date)
+        for section in sections
+    }
+
+
+def _section_fragment(section: str, result: dict) -> dict:
+    # channel_metrics is nested under its name; the other fetchers already
+    # return their top-level keys
+    return {section: result} if section == "channel_metrics" else result
+
+
+def _fetch_dashboard_concurrent(email: str, start_date: str, end_date: str, sections: Tuple[str, ...]) -> dict:
+    futures = _submit_sections(email, start_date, end_date, sections)
     try:
         data = {}
-        data.update(fetch_channel_info(email))  # Add channel info first
-
-        data["channel_metrics"] = fetch_channel_metrics(email,start_date, end_date)
-        
-        data.update(fetch_top_videos(email,start_date, end_date))
-        data.update(fetch_demographics(email,start_date, end_date))
-        data.update(fetch_traffic_sources(email,start_date, end_date))
-        data.update(fetch_geography(email,start_date, end_date))
+        for section, future in futures.items():
+            data.update(_section_fragment(section, future.result()))
         return data
+    finally:
+        for future in futures.values():
+            future.cancel()
+
+
+def iter_dashboard_sections(
+    email: str, start_date: str, end_date: str, sections: Optional[Tuple[str, ...]] = None
+) -> Iterator[Tuple[str, dict]]:
+    """Yield (section, fragment) as each report finishes; the fragments merge into the dashboard."""
+    futures = _submit_sections(email, start_date, end_date, sections or DASHBOARD_SECTIONS)
+    by_future = {future: section for section, future in futures.items()}
+    try:
+        for future in as_completed(by_future):
+            section = by_future[future]
+            yield section, _section_fragment(section, future.result())
+    except RefreshError:
+        _services_cache.invalidate(email)
+        raise HTTPException(401, "Authorization expired. Please re-authenticate.")
+    finally:
+        for future in futures.values():
+            future.cancel()
+
+
+def _fetch_dashboard_sequential(email: str, start_date: str, end_date: str, sections: Tuple[str, ...]) -> dict:
+    data = {}
+    for section in sections:
+        data.update(_section_fragment(section, _SECTION_FETCHERS[section](email, start_date, end_date)))
+    return data
+
+
+# Duplicate dashboard requests (several tabs, a double mount) wait for the
+# build already in flight for the same user and range
+_dashboard_flight = SingleFlight("youtube_dashboard")
+
+
+def fetch_dashboard_data(
+    email: str,
+    start_date: str,
+    end_date: str,
+    concurrent: Optional[bool] = None,
+    revalidate: bool = False,
+    sections: Optional[Tuple[str, ...]] = None,
+) -> dict:
+    """
+    Dashboard sections (all of DASHBOARD_SECTIONS, or only `sections`, in
+    that order); revalidate=True refetches reports past their soft TTL.
+    """
+    if concurrent is None:
+        concurrent = YT_DASHBOARD_CONCURRENT
+    sections = tuple(section for section in DASHBOARD_SECTIONS if sections is None or section in sections)
+    return _dashboard_flight.do(
+        (email, start_date, end_date, revalidate, sections),
+        lambda: _fetch_dashboard(email, start_date, end_date, concurrent, revalidate, sections),
+    )
+
+
+def _fetch_dashboard(
+    email: str, start_date: str, end_date: str, concurrent: bool, revalidate: bool, sections: Tuple[str, ...]
+) -> dict:
+    token = _skip_stale_reports.set(revalidate)
+    try:
+        if concurrent:
+            return _fetch_dashboard_concurrent(email, start_date, end_date, sections)
+        return _fetch_dashboard_sequential(email, start_date, end_date, sections)
     except RefreshError:
-        global _services_cache
-        _services_cache = None
-        raise HTTPException(401, "Authorization expired. Please re-authenticate.")
\ No newline at end of file
+        _services_cache.invalidate(email)
+        raise HTTPException(401, "Authorization expired. Please re-authenticate.")
+    finally:
+        _skip_stale_reports.reset(token)
+
+
+def rebuild_youtube_snapshot(email: str, start_date: str, end_date: str) -> None:
+    """Fetch the dashboard with fresh reports and store it as the next snapshot."""
+    data = fetch_dashboard_data(email, start_date, end_date, revalidate=True)
+    save_snapshot(email, "youtube", youtube_params_key(start_date, end_date), dumps(data))
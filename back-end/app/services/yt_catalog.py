@@ -0,0 +1,149 @@
+# app/services/yt_catalog.py
+#
+# Persisted per-channel video catalog. Uploads are read from the channel's
+# uploads playlist (playlistItems.list, 1 quota unit per page) instead of
+# search().list (100 units per page), and only uploads newer than the newest
+# known video are fetched on each sync.
+
+import os
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from sqlalchemy import delete, select
+from sqlalchemy.exc import IntegrityError
+
+from app.db.session import SessionLocal
+from app.models.models import User, YouTubeChannel, YouTubeDailyMetric, YouTubeVideo
+
+# Skip the upstream check entirely if the catalog was synced this recently.
+YT_CATALOG_SYNC_INTERVAL = int(os.getenv("YT_CATALOG_SYNC_INTERVAL", "300"))
+
+_channel_locks: Dict[str, threading.Lock] = {}
+_channel_locks_lock = threading.Lock()
+
+
+def _channel_lock(channel_id: str) -> threading.Lock:
+    with _channel_locks_lock:
+        lock = _channel_locks.get(channel_id)
+        if lock is None:
+            lock = _channel_locks[channel_id] = threading.Lock()
+        return lock
+
+
+def _parse_published_at(value: Optional[str]) -> Optional[datetime]:
+    if not value:
+        return None
+    return datetime.strptime(value[:19], "%Y-%m-%dT%H:%M:%S")
+
+
+def _stored_channel(db, email: str) -> Optional[YouTubeChannel]:
+    return (
+        db.query(YouTubeChannel)
+        .join(User, User.id == YouTubeChannel.user_id)
+        .filter(User.email == email)
+        .first()
+    )
+
+
+def resolve_channel(db, email: str, yt_data) -> YouTubeChannel:
+    """Return the stored channel for a user, looking it up once if missing."""
+    channel = _stored_channel(db, email)
+    if channel:
+        return channel
+
+    user = db.query(User).filter_by(email=email).first()
+    response = yt_data.channels().list(part="id,contentDetails", mine=True).execute()
+    item = response["items"][0]
+    channel = db.get(YouTubeChannel, item["id"])
+    if channel is None:
+        channel = YouTubeChannel(id=item["id"])
+        db.add(channel)
+    channel.user_id = user.id
+    channel.uploads_playlist_id = item["contentDetails"]["relatedPlaylists"]["uploads"]
+    try:
+        db.commit()
+    except IntegrityError:
+        # A concurrent dashboard task (e.g. the catalog and the warehouse on
+        # a first load) stored the same channel first
+        db.rollback()
+        channel = _stored_channel(db, email)
+        if channel is None:
+            raise
+    return channel
+
+
+def clear_channel(user_id: int) -> list:
+    """Delete statements for a user's channel with its catalog and warehouse rows.
+
+    Run on connect/disconnect: the stored channel is looked up by user, so a
+    user reconnecting a different Google channel would otherwise keep
+    reading (and writing metrics under) the old one.
+    """
+    channel_ids = select(YouTubeChannel.id).where(YouTubeChannel.user_id == user_id)
+    return [
+        delete(YouTubeDailyMetric).where(YouTubeDailyMetric.channel_id.in_(channel_ids)),
+        delete(YouTubeVideo).where(YouTubeVideo.channel_id.in_(channel_ids)),
+        delete(YouTubeChannel).where(YouTubeChannel.user_id == user_id),
+    ]
+
+
+def _fetch_new_uploads(yt_data, playlist_id: str, known_ids: set) -> List[dict]:
+    """Page the uploads playlist (newest first) until a known video shows up."""
+    new_items = []
+    page_token = None
+    while True:
+        response = yt_data.playlistItems().list(
+            part="contentDetails",
+            playlistId=playlist_id,
+            maxResults=50,
+            pageToken=page_token,
+        ).execute()
+
+        for item in response.get("items", []):
+            details = item["contentDetails"]
+            if details["videoId"] in known_ids:
+                return new_items
+            new_items.append(details)
+
+        page_token = response.get("nextPageToken")
+        if not page_token:
+            return new_items
+
+
+def sync_video_catalog(email: str, yt_data, force: bool = False) -> List[str]:
+    """Bring the catalog up to date and return the channel's video ids, newest first."""
+    db = SessionLocal()
+    try:
+        channel = resolve_channel(db, email, yt_data)
+
+        with _channel_lock(channel.id):
+            db.refresh(channel)
+            fresh_until = (channel.videos_synced_at or datetime.min) + timedelta(seconds=YT_CATALOG_SYNC_INTERVAL)
+            if force or datetime.utcnow() >= fresh_until:
+                known_ids = {
+                    video_id
+                    for (video_id,) in db.query(YouTubeVideo.id).filter_by(channel_id=channel.id)
+                }
+                for details in _fetch_new_uploads(yt_data, channel.uploads_playlist_id, known_ids):
+                    db.add(YouTubeVideo(
+                        id=details["videoId"],
+                        channel_id=channel.id,
+                        published_at=_parse_published_at(details.get("videoPublishedAt")),
+                    ))
+                channel.videos_synced_at = datetime.utcnow()
+                try:
+                    db.commit()
+                except IntegrityError:
+                    # Another worker synced the same uploads first.
+                    db.rollback()
+
+        rows = (
+            db.query(YouTubeVideo.id)
+            .filter_by(channel_id=channel.id)
+            .order_by(YouTubeVideo.published_at.desc())
+            .all()
+        )
+        return [video_id for (video_id,) in rows]
+    finally:
+        db.close()
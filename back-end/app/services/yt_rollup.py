@@ -0,0 +1,78 @@
+# app/services/yt_rollup.py
+#
+# Server-side roll-up of daily channel metrics into weekly, monthly or yearly
+# buckets. Rows come in the Analytics resultTable shape produced by
+# fetch_channel_metrics and go out in the same shape, one row per bucket,
+# keyed by the bucket's first day.
+
+from itertools import chain
+from typing import List
+
+import numpy as np
+
+ROLLUP_FREQUENCIES = ("daily", "weekly", "monthly", "yearly")
+
+# Metrics averaged per view rather than summed
+VIEW_WEIGHTED = ("averageViewDuration", "averageViewPercentage")
+
+
+def _bucket_starts(days: np.ndarray, frequency: str) -> np.ndarray:
+    if frequency == "weekly":
+        # 1970-01-01 was a Thursday; shift so weeks start on Monday
+        weekday = (days.astype(np.int64) + 3) % 7
+        return days - weekday.astype("timedelta64[D]")
+    if frequency == "monthly":
+        return days.astype("datetime64[M]").astype("datetime64[D]")
+    if frequency == "yearly":
+        return days.astype("datetime64[Y]").astype("datetime64[D]")
+    raise ValueError(f"Unsupported roll-up frequency: {frequency}")
+
+
+def rollup_daily_metrics(result: dict, frequency: str) -> dict:
+    """Aggregate daily resultTable rows into `frequency` buckets.
+
+    Metrics are summed except averageViewDuration and averageViewPercentage,
+    which are weighted by views. A netSubscribers column is appended.
+    """
+    if frequency == "daily":
+        return result
+
+    headers: List[dict] = result.get("columnHeaders", [])
+    names = [header["name"] for header in headers]
+    rows = result.get("rows") or []
+    out_headers = headers + [{"name": "netSubscribers", "columnType": "METRIC", "dataType": "INTEGER"}]
+    if not rows:
+        return {**result, "columnHeaders": out_headers, "rows": []}
+
+    days = np.array([row[0] for row in rows], dtype="datetime64[D]")
+    width = len(names) - 1
+    values = np.fromiter(
+        chain.from_iterable(row[1:] for row in rows), dtype=np.float64, count=len(rows) * width
+    ).reshape(len(rows), width)
+    order = np.argsort(days, kind="stable")
+    days, values = days[order], values[order]
+
+    buckets, starts = np.unique(_bucket_starts(days, frequency), return_index=True)
+    metric_names = names[1:]
+    views = values[:, metric_names.index("views")]
+
+    sums = np.add.reduceat(values, starts, axis=0)
+    bucket_views = sums[:, metric_names.index("views")]
+    for name in VIEW_WEIGHTED:
+        if name in metric_names:
+            col = metric_names.index(name)
+            weighted = np.add.reduceat(values[:, col] * views, starts)
+            sums[:, col] = np.divide(weighted, bucket_views, out=np.zeros_like(weighted), where=bucket_views > 0)
+
+    net = sums[:, metric_names.index("subscribersGained")] - sums[:, metric_names.index("subscribersLost")]
+    table = np.column_stack([sums, net])
+
+    float_cols = {col for col, header in enumerate(headers[1:]) if header.get("dataType") == "FLOAT"}
+    labels = buckets.astype(str).tolist()
+    out_rows = []
+    for label, bucket in zip(labels, table.tolist()):
+        out_rows.append([label] + [
+            round(value, 2) if col in float_cols else int(round(value))
+            for col, value in enumerate(bucket)
+        ])
+    return {**result, "columnHeaders": out_headers, "rows": out_rows}
@@ -0,0 +1,151 @@
+# app/services/yt_warehouse.py
+#
+# Local store of daily channel metrics. fetch_channel_metrics reads through
+# it: stored days are served from the DB and only days that are missing, or
+# were last fetched while still inside YouTube's revision window, go
+# upstream.
+
+import os
+from datetime import date, datetime, timedelta
+from typing import List, Tuple
+
+from sqlalchemy.exc import IntegrityError
+
+from app.db.session import SessionLocal
+from app.models.models import YouTubeDailyMetric
+from app.services.yt_catalog import resolve_channel
+
+# YouTube keeps revising recent days; anything fetched this close to its
+# date is refetched until a copy from after the window is stored.
+YT_REVISION_WINDOW_DAYS = int(os.getenv("YT_REVISION_WINDOW_DAYS", "3"))
+
+# (Analytics metric, model column, dataType) in the order the API returns them
+DAILY_METRICS = [
+    ("views", "views", "INTEGER"),
+    ("estimatedMinutesWatched", "estimated_minutes_watched", "INTEGER"),
+    ("averageViewDuration", "average_view_duration", "INTEGER"),
+    ("averageViewPercentage", "average_view_percentage", "FLOAT"),
+    ("subscribersGained", "subscribers_gained", "INTEGER"),
+    ("subscribersLost", "subscribers_lost", "INTEGER"),
+    ("likes", "likes", "INTEGER"),
+    ("dislikes", "dislikes", "INTEGER"),
+    ("shares", "shares", "INTEGER"),
+    ("comments", "comments", "INTEGER"),
+]
+
+COLUMN_HEADERS = [{"name": "day", "columnType": "DIMENSION", "dataType": "STRING"}] + [
+    {"name": metric, "columnType": "METRIC", "dataType": data_type}
+    for metric, _, data_type in DAILY_METRICS
+]
+
+
+def _is_final(row: YouTubeDailyMetric) -> bool:
+    return row.fetched_at.date() - row.d_date > timedelta(days=YT_REVISION_WINDOW_DAYS)
+
+
+def missing_ranges(final_days: set, start: date, end: date) -> List[Tuple[date, date]]:
+    """Contiguous [from, to] ranges of days in [start, end] that need fetching."""
+    ranges = []
+    range_start = None
+    day = start
+    while day <= end:
+        if day not in final_days:
+            range_start = range_start or day
+        elif range_start:
+            ranges.append((range_start, day - timedelta(days=1)))
+            range_start = None
+        day += timedelta(days=1)
+    if range_start:
+        ranges.append((range_start, end))
+    return ranges
+
+
+def _fetch_range(yt_analytics, start: date, end: date) -> List[list]:
+    return yt_analytics.reports().query(
+        ids='channel==MINE',
+        startDate=start.isoformat(),
+        endDate=end.isoformat(),
+        metrics=','.join(metric for metric, _, _ in DAILY_METRICS),
+        dimensions='day',
+        sort='day'
+    ).execute().get('rows', [])
+
+
+def _store_range(db, channel_id: str, start: date, end: date, api_rows: List[list]) -> None:
+    fetched_at = datetime.utcnow()
+    by_day = {row[0]: row[1:] for row in api_rows}
+    db.query(YouTubeDailyMetric).filter(
+        YouTubeDailyMetric.channel_id == channel_id,
+        YouTubeDailyMetric.d_date.between(start, end),
+    ).delete(synchronize_session=False)
+
+    settled_before = fetched_at.date() - timedelta(days=YT_REVISION_WINDOW_DAYS)
+    day = start
+    while day <= end:
+        values = by_day.get(day.isoformat())
+        if values is None:
+            # A settled day the API leaves out had no activity; store it as
+            # zeros so it isn't asked for again. Recent days are often just
+            # not reported yet, so they stay missing rather than read as 0.
+            if day >= settled_before:
+                day += timedelta(days=1)
+                continue
+            values = [0] * len(DAILY_METRICS)
+        db.add(YouTubeDailyMetric(
+            channel_id=channel_id,
+            d_date=day,
+            fetched_at=fetched_at,
+            **{column: value for (_, column, _), value in zip(DAILY_METRICS, values)},
+        ))
+        day += timedelta(days=1)
+
+
+def _to_api_row(row: YouTubeDailyMetric) -> list:
+    values = [row.d_date.isoformat()]
+    for _, column, data_type in DAILY_METRICS:
+        value = getattr(row, column)
+        values.append(float(value) if data_type == "FLOAT" else int(value))
+    return values
+
+
+def read_daily_metrics(email: str, yt_analytics, yt_data, start_date: str, end_date: str) -> dict:
+    """Daily channel metrics for [start_date, end_date] in the Analytics resultTable shape."""
+    start = date.fromisoformat(start_date)
+    end = date.fromisoformat(end_date)
+
+    db = SessionLocal()
+    try:
+        channel = resolve_channel(db, email, yt_data)
+
+        def stored_rows():
+            return (
+                db.query(YouTubeDailyMetric)
+                .filter(
+                    YouTubeDailyMetric.channel_id == channel.id,
+                    YouTubeDailyMetric.d_date.between(start, end),
+                )
+                .order_by(YouTubeDailyMetric.d_date)
+                .all()
+            )
+
+        rows = stored_rows()
+        gaps = missing_ranges({row.d_date for row in rows if _is_final(row)}, start, end)
+        if gaps:
+            for row in rows:
+                db.expunge(row)
+            for gap_start, gap_end in gaps:
+                _store_range(db, channel.id, gap_start, gap_end, _fetch_range(yt_analytics, gap_start, gap_end))
+            try:
+                db.commit()
+            except IntegrityError:
+                # A concurrent request filled the same days first.
+                db.rollback()
+            rows = stored_rows()
+
+        return {
+            "kind": "youtubeAnalytics#resultTable",
+            "columnHeaders": COLUMN_HEADERS,
+            "rows": [_to_api_row(row) for row in rows],
+        }
+    finally:
+        db.close()
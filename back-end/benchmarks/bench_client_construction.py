@@ -0,0 +1,53 @@
+"""
+Startup benchmark for YouTube client construction.
+
+Compares googleapiclient's ``build()`` (reads and parses the discovery
+document on every call) with ``build_client()`` from yt_analytics_v2, which
+builds from the pinned documents in app/services/discovery parsed once per
+process.
+
+Run from back-end/:
+    python -m benchmarks.bench_client_construction
+"""
+import os
+import time
+
+os.environ.setdefault("SQLALCHEMY_DATABASE_URL", "sqlite:///./test.db")
+
+from google.oauth2.credentials import Credentials
+from googleapiclient.discovery import build
+
+from app.services import yt_analytics_v2
+
+APIS = [("youtubeAnalytics", "v2"), ("youtube", "v3")]
+ROUNDS = 50
+
+
+def _time(fn, rounds: int) -> tuple:
+    start = time.perf_counter()
+    fn()
+    first = time.perf_counter() - start
+    start = time.perf_counter()
+    for _ in range(rounds):
+        fn()
+    return first, (time.perf_counter() - start) / rounds
+
+
+def main():
+    creds = Credentials(token="benchmark")
+
+    def before():
+        for api, version in APIS:
+            build(api, version, credentials=creds, cache_discovery=False)
+
+    def after():
+        for api, version in APIS:
+            yt_analytics_v2.build_client(api, version, creds)
+
+    for label, fn in (("build()", before), ("build_client()", after)):
+        first, mean = _time(fn, ROUNDS)
+        print(f"{label:<16} first: {first * 1000:8.2f} ms   mean of {ROUNDS}: {mean * 1000:8.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Benchmark for the NumPy roll-up of daily channel metrics.
+
+Builds a multi-year daily resultTable and times rollup_daily_metrics against
+a plain-Python loop doing the same aggregation (what the client used to do),
+checking both give the same answer.
+
+Run from back-end/:
+    python -m benchmarks.bench_rollup
+"""
+import os
+import random
+import time
+from datetime import date, timedelta
+
+os.environ.setdefault("SQLALCHEMY_DATABASE_URL", "sqlite:///./test.db")
+
+from app.services.yt_rollup import rollup_daily_metrics
+from app.services.yt_warehouse import COLUMN_HEADERS
+
+ROUNDS = 20
+
+
+def make_result(years: int) -> dict:
+    rng = random.Random(42)
+    start = date(2000, 1, 1)
+    rows = []
+    for offset in range(365 * years):
+        views = rng.randint(0, 5000)
+        rows.append([
+            (start + timedelta(days=offset)).isoformat(),
+            views, views * 3, rng.randint(10, 300), round(rng.uniform(5, 95), 2),
+            rng.randint(0, 50), rng.randint(0, 20),
+            rng.randint(0, 400), rng.randint(0, 20), rng.randint(0, 40), rng.randint(0, 60),
+        ])
+    return {"kind": "youtubeAnalytics#resultTable", "columnHeaders": COLUMN_HEADERS, "rows": rows}
+
+
+def python_rollup(result: dict, frequency: str) -> list:
+    buckets = {}
+    for row in result["rows"]:
+        day = date.fromisoformat(row[0])
+        if frequency == "weekly":
+            key = day - timedelta(days=day.weekday())
+        elif frequency == "monthly":
+            key = day.replace(day=1)
+        else:
+            key = day.replace(month=1, day=1)
+        bucket = buckets.setdefault(key, [0.0] * 10)
+        views = row[1]
+        for col, value in enumerate(row[1:]):
+            bucket[col] += value * views if col in (2, 3) else value
+    out = []
+    for key in sorted(buckets):
+        bucket = buckets[key]
+        for col in (2, 3):
+            bucket[col] = bucket[col] / bucket[0] if bucket[0] else 0.0
+        out.append([key.isoformat()] + bucket + [bucket[4] - bucket[5]])
+    return out
+
+
+def main():
+    for years in (3, 10, 30):
+        result = make_result(years)
+        for frequency in ("weekly", "monthly", "yearly"):
+            start = time.perf_counter()
+            for _ in range(ROUNDS):
+                fast = rollup_daily_metrics(result, frequency)["rows"]
+            numpy_ms = (time.perf_counter() - start) / ROUNDS * 1000
+
+            start = time.perf_counter()
+            for _ in range(ROUNDS):
+                slow = python_rollup(result, frequency)
+            python_ms = (time.perf_counter() - start) / ROUNDS * 1000
+
+            assert [row[0] for row in fast] == [row[0] for row in slow]
+            assert all(abs(a[1] - b[1]) < 1e-6 and abs(a[4] - b[4]) < 0.01 for a, b in zip(fast, slow))
+            print(f"{years:>2}y {frequency:<8} numpy: {numpy_ms:7.2f} ms   python: {python_ms:7.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
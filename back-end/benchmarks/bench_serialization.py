@@ -0,0 +1,142 @@
+"""
+Benchmark for the dashboard response path with 500 media items.
+
+Compares the old path (build the pydantic models, then let FastAPI
+validate them again against response_model=DashboardData and JSON-encode
+the result) with the single-validation path (one cached TypeAdapter
+validation, serialized by pydantic-core). It also compares jsonable_encoder
+plus json against orjson for the YouTube-style raw dict payload, and checks
+that both paths give the same JSON.
+
+Run from back-end/:
+    python -m benchmarks.bench_serialization
+"""
+import asyncio
+import json
+import os
+import random
+import time
+
+os.environ.setdefault("SQLALCHEMY_DATABASE_URL", "sqlite:///./test.db")
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_model_field
+
+from app.services.instagram_dashboard import (
+    AudienceInsights,
+    DashboardData,
+    MediaItem,
+    ProfileOverview,
+    UserInsights,
+)
+from app.core.serialization import ORJSON_AVAILABLE, FastJSONResponse, dump_model, validate
+
+MEDIA_ITEMS = 500
+ROUNDS = 50
+
+
+def make_payload(media_items: int) -> dict:
+    rng = random.Random(42)
+    media = [
+        {
+            "id": f"1790000000{i:05d}",
+            "caption": "caption " * rng.randint(1, 20),
+            "timestamp": "2026-10-01T12:00:00+0000",
+            "like_count": rng.randint(0, 5000),
+            "comments_count": rng.randint(0, 300),
+            "saves_count": rng.randint(0, 200),
+            "shares_count": rng.randint(0, 100),
+            "reach": rng.randint(0, 50000),
+            "impressions": rng.randint(0, 80000),
+            "media_url": f"https://cdn.example.com/{i}.jpg",
+            "permalink": f"https://www.instagram.com/p/{i}/",
+            "media_type": "IMAGE",
+        }
+        for i in range(media_items)
+    ]
+    insights = [
+        {
+            "date": f"2026-09-{day:02d}", "follower_count": 1000 + day, "reach": 500, "views": 900,
+            "accounts_engaged": 80, "comments": 12, "likes": 300, "saves": 9, "shares": 4,
+            "total_interactions": 325,
+        }
+        for day in range(1, 29)
+    ]
+    return {
+        "profile": {
+            "username": "bench", "profile_picture_url": "https://cdn.example.com/p.jpg",
+            "followers_count": 12000, "follows_count": 300, "bio": "bio", "link_in_bio": None,
+            "media_count": media_items, "profile_views": 40,
+        },
+        "user_insights": insights,
+        "recent_media": media,
+        "top_media": sorted(media, key=lambda m: m["impressions"], reverse=True)[:5],
+        "total_followers": 12000,
+        "audience_insights": {
+            "reach": 500, "views": 900, "online_followers": {str(h): h * 10 for h in range(24)},
+            "profile_views": 40, "website_clicks": 3,
+        },
+        "engagement_rate": 2.5,
+    }
+
+
+def build_models(payload: dict) -> DashboardData:
+    # What instagram_dashboard used to do before returning
+    media = [MediaItem(**m) for m in payload["recent_media"]]
+    return DashboardData(
+        profile=ProfileOverview(**payload["profile"]),
+        user_insights=[UserInsights(**row) for row in payload["user_insights"]],
+        recent_media=media,
+        top_media=sorted(media, key=lambda m: m.impressions or 0, reverse=True)[:5],
+        total_followers=payload["total_followers"],
+        audience_insights=AudienceInsights(**payload["audience_insights"]),
+        engagement_rate=payload["engagement_rate"],
+    )
+
+
+def time_it(fn) -> float:
+    fn()
+    started = time.perf_counter()
+    for _ in range(ROUNDS):
+        fn()
+    return (time.perf_counter() - started) / ROUNDS * 1000
+
+
+def main() -> None:
+    payload = make_payload(MEDIA_ITEMS)
+    field = create_model_field("Response", DashboardData, mode="serialization")
+    loop = asyncio.new_event_loop()
+
+    def old_path() -> bytes:
+        content = loop.run_until_complete(
+            serialize_response(field=field, response_content=build_models(payload))
+        )
+        return JSONResponse(content).body
+
+    def fast_path() -> bytes:
+        # What the endpoints send: the dump_model bytes as the Response body
+        return dump_model(DashboardData, validate(DashboardData, payload))
+
+    def raw_default() -> bytes:
+        return JSONResponse(jsonable_encoder(payload)).body
+
+    def raw_fast() -> bytes:
+        return FastJSONResponse(payload).body
+
+    assert json.loads(old_path()) == json.loads(fast_path())
+    assert json.loads(raw_default()) == json.loads(raw_fast())
+
+    print(f"dashboard with {MEDIA_ITEMS} media items, {ROUNDS} rounds (orjson: {ORJSON_AVAILABLE})")
+    old_ms, fast_ms = time_it(old_path), time_it(fast_path)
+    print(f"  instagram  models + response_model  {old_ms:8.2f} ms")
+    print(f"  instagram  single validation        {fast_ms:8.2f} ms  ({old_ms / fast_ms:.1f}x)")
+    raw_ms, orjson_ms = time_it(raw_default), time_it(raw_fast)
+    print(f"  raw dict   jsonable_encoder + json  {raw_ms:8.2f} ms")
+    print(f"  raw dict   FastJSONResponse         {orjson_ms:8.2f} ms  ({raw_ms / orjson_ms:.1f}x)")
+    loop.close()
+
+
+if __name__ == "__main__":
+    main()